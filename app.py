@@ -2,12 +2,19 @@
 # Import the necessary libraries
 ########################################################
 import streamlit as st
+from sub.logging_setup import configure_logging
+
+# Configure logging first so start-up messages from the modules below are captured
+configure_logging(
+    level=st.secrets.get("LOG_LEVEL", "INFO"),
+    sample_rates=dict(st.secrets.get("LOG_SAMPLE_RATES", {})),
+    rate_limits=dict(st.secrets.get("LOG_RATE_LIMITS", {})),
+    log_payloads=bool(st.secrets.get("LOG_PAYLOADS", False))
+)
+
 from sub.agent_logic import agent
 from sub.prompts import (
     get_system_prompt, 
-    get_conversation_mode_prompt,
-    get_grammar_mode_prompt, 
-    get_vocabulary_mode_prompt,
     get_welcome_message,
     get_conversation_response,
     get_grammar_response,
@@ -18,12 +25,18 @@ import os
 from datetime import datetime
 from sub.tools import (
     load_memories, 
-    save_memory,
+    save_memory_async,
     get_user_profile_path,
     save_user_profile, 
     load_user_profile,
+    srs,
+    lexicons,
     USER_PROFILES_DIR
 )
+from sub.srs import GRADES
+from sub.lexicon import merge_level_profiles
+from sub.session_store import create_session_store, HashRing
+from sub.prefetch import LessonPrefetcher
 
 ########################################################
 # Set the page config
@@ -33,20 +46,200 @@ st.set_page_config(
     layout="centered", initial_sidebar_state="collapsed"
 )
 
+########################################################
+# Lesson options
+########################################################
+LANGUAGES = [
+    "English", "French", "Spanish", "German", 
+    "Portuguese", "Thai", "Polish", "Russian"
+]
+
+# CEFR Proficiency levels
+LEVELS = ["A1 (Beginner)", "A2 (Elementary)", "B1 (Intermediate)", 
+          "B2 (Upper Intermediate)", "C1 (Advanced)"]
+
+PRACTICE_MODES = {
+    "conversation": {
+        "message": "I'd like to practice conversation.",
+        "response_func": get_conversation_response,
+        "button_text": "Conversation Practice"
+    },
+    "grammar": {
+        "message": "I'd like to practice grammar.",
+        "response_func": get_grammar_response,
+        "button_text": "Grammar Exercises"
+    },
+    "vocabulary": {
+        "message": "I'd like to build my vocabulary.",
+        "response_func": get_vocabulary_response,
+        "button_text": "Vocabulary Building"
+    }
+}
+
+# Number of latest messages shown as chat bubbles; older ones are collapsed into one block
+HISTORY_TAIL = 6
+
+# Request sent on the user's behalf by "End Lesson"; not part of their own writing
+EVALUATION_REQUEST = "Please evaluate my performance in this lesson. Give me a score out of 10 and a brief summary of what I did well and what I can improve on."
+
+########################################################
+# Server-side session store
+########################################################
+# Lesson state that is persisted alongside the messages
+SESSION_STATE_KEYS = ['conversation_started', 'mode_selected', 'lesson_ended', 'lesson_score']
+
+@st.cache_resource
+def get_session_store():
+    # One store per server process, shared by every browser session
+    return create_session_store(
+        backend=st.secrets.get("SESSION_STORE", "sqlite"),
+        path=st.secrets.get("SESSION_STORE_PATH", "sessions.db"),
+        redis_url=st.secrets.get("REDIS_URL")
+    )
+
+@st.cache_resource
+def get_hash_ring():
+    return HashRing(st.secrets.get("SESSION_NODES", []))
+
+@st.cache_resource
+def get_prefetcher():
+    # Background lesson preparation shared by every browser session
+    return LessonPrefetcher(ttl=float(st.secrets.get("PREFETCH_TTL", 900)))
+
+session_store = get_session_store()
+prefetcher = get_prefetcher()
+
+def restore_session(user_id):
+    """Load a saved conversation for user_id into st.session_state, if there is one."""
+    saved = session_store.load(user_id)
+    st.session_state.pop("history_cache", None)
+    st.session_state.pop("vocabulary_cache", None)
+    if saved:
+        st.session_state.messages = saved["messages"]
+        for key in SESSION_STATE_KEYS:
+            st.session_state[key] = saved["state"].get(key, st.session_state[key])
+    # Keep the ID in the URL so the session survives a page reload or worker restart
+    st.query_params["uid"] = user_id
+    # Tell a hash-aware load balancer which node should serve this user
+    if node := get_hash_ring().node_for(user_id):
+        st.query_params["node"] = node
+
+def persist_state():
+    """Save the lesson state for the current user."""
+    session_store.save_state(st.session_state.user_id, {key: st.session_state[key] for key in SESSION_STATE_KEYS})
+
+def add_message(role, content):
+    """Append a message to the conversation and the session store."""
+    message = {"role": role, "content": content}
+    st.session_state.messages.append(message)
+    session_store.append_message(st.session_state.user_id, message)
+
+def set_system_prompt(content):
+    """Replace the system prompt in the conversation and the session store."""
+    st.session_state.messages[0]["content"] = content
+    session_store.update_message(st.session_state.user_id, 0, st.session_state.messages[0])
+
+def lesson_vocabulary_profile(lexicon, cefr_level):
+    """
+    Profile the CEFR levels of everything the user has written this lesson, locally.
+    
+    The running profile is kept in session state, so each rerun only profiles
+    the user messages added since the last one. The evaluation request that
+    "End Lesson" sends is skipped, so the profile stays as it was when the lesson ended.
+    """
+    key = (lexicon.language, cefr_level)
+    cache = st.session_state.get("vocabulary_cache")
+    if cache is None or cache["key"] != key or cache["count"] > len(st.session_state.messages):
+        cache = st.session_state.vocabulary_cache = {
+            "key": key, "count": 0, "profile": lexicon.level_profile("", target_level=cefr_level)
+        }
+    for msg in st.session_state.messages[cache["count"]:]:
+        if msg["role"] == "user" and msg["content"] != EVALUATION_REQUEST:
+            message_profile = lexicon.level_profile(msg["content"], target_level=cefr_level)
+            cache["profile"] = merge_level_profiles(cache["profile"], message_profile)
+    cache["count"] = len(st.session_state.messages)
+    return cache["profile"]
+
+def get_user_profile():
+    """Get the current user's profile, reading it from disk only when the user changes."""
+    profile = st.session_state.get("user_profile")
+    if profile is None or profile.get("user_id") != st.session_state.user_id:
+        profile = load_user_profile(st.session_state.user_id)
+        st.session_state.user_profile = profile
+    return profile
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_memory_preview(user_id):
+    # A failed lookup raises, and st.cache_data doesn't cache exceptions
+    return load_memories("", user_id=user_id, raise_errors=True)
+
+def memory_preview(user_id):
+    """Recent memories for the sidebar, memoized per user so reruns don't repeat the lookup."""
+    try:
+        return _cached_memory_preview(user_id)
+    except Exception:
+        return []
+
+def history_markdown(count):
+    """
+    Render the first count messages after the system prompt as one markdown block.
+    
+    The transcript is append-only, so the rendered text is kept in session state
+    and only messages added since the last render are formatted.
+    """
+    cache = st.session_state.get("history_cache")
+    if cache is None or cache["count"] > count:
+        cache = st.session_state.history_cache = {"count": 0, "markdown": ""}
+    for msg in st.session_state.messages[1 + cache["count"]:1 + count]:
+        speaker = "You" if msg["role"] == "user" else "Tutor"
+        separator = "\n\n---\n\n" if cache["markdown"] else ""
+        cache["markdown"] += f"{separator}**{speaker}:** {msg['content']}"
+    cache["count"] = count
+    return cache["markdown"]
+
+def render_history():
+    """Show the conversation, collapsing all but the latest messages into one cached block."""
+    visible = st.session_state.messages[1:]
+    older = len(visible) - HISTORY_TAIL
+    if older > 0:
+        with st.expander(f"Earlier in this lesson ({older} messages)"):
+            st.markdown(history_markdown(older))
+    for msg in visible[max(older, 0):]:
+        st.chat_message(msg["role"]).write(msg["content"])
+
+def reset_conversation():
+    """Clear the conversation and lesson state, locally and in the session store."""
+    st.session_state.messages = []
+    st.session_state.pop("history_cache", None)
+    st.session_state.pop("vocabulary_cache", None)
+    st.session_state.conversation_started = False
+    st.session_state.mode_selected = False
+    st.session_state.lesson_ended = False
+    st.session_state.lesson_score = None
+    session_store.clear(st.session_state.user_id)
+
 # Initialize session state variables if not present
 for var in ['conversation_started', 'mode_selected', 'messages', 'user_id', 'lesson_ended', 'lesson_score']:
     if var not in st.session_state:
         st.session_state[var] = False if var not in ['messages', 'lesson_score'] else [] if var == 'messages' else None
         if var == 'user_id':
-            st.session_state.user_id = str(uuid.uuid4())
+            # A reload or a new worker keeps the ID from the URL, so the saved session is found
+            st.session_state.user_id = st.query_params.get("uid") or str(uuid.uuid4())
+
+# Recover a conversation from the session store after a restart or on another node
+if 'session_restored' not in st.session_state:
+    restore_session(st.session_state.user_id)
+    st.session_state.session_restored = True
 
 # Load or create user profile
-user_profile = load_user_profile(st.session_state.user_id)
+user_profile = get_user_profile()
 
 ########################################################
 # Sidebar Configuration
 ########################################################
-with st.sidebar:
+@st.fragment
+def user_id_panel():
+    """User ID display and switching; reruns on its own while the ID is being edited."""
     st.title("User ID")
     st.info("Copy this ID to return to your learning progress in future sessions.")
     
@@ -63,19 +256,32 @@ with st.sidebar:
     if st.button("Update User ID"):
         old_user_id = st.session_state.user_id
         st.session_state.user_id = user_id_input
+        # Pick up the conversation saved under the new ID, if any
+        if old_user_id != user_id_input:
+            st.session_state.messages = []
+            for key in SESSION_STATE_KEYS:
+                st.session_state[key] = None if key == 'lesson_score' else False
+            restore_session(user_id_input)
         # Reload user profile with new ID
-        user_profile = load_user_profile(st.session_state.user_id)
-        st.success(f"User ID updated from {old_user_id[:8]}... to {user_id_input[:8]}...")
+        st.session_state.user_profile = load_user_profile(st.session_state.user_id)
+        # The whole page depends on the user, so apply the change everywhere
+        st.session_state.previous_user_id = old_user_id
+        st.rerun()
+    
+    # Confirm the change once, on the rerun that applied it
+    if old_user_id := st.session_state.pop("previous_user_id", None):
+        profile = get_user_profile()
+        st.success(f"User ID updated from {old_user_id[:8]}... to {st.session_state.user_id[:8]}...")
         
         # Profile information display
         st.write("#### Profile Information:")
-        st.write(f"- Created: {user_profile['created_at']}")
-        st.write(f"- Languages studied: {len(user_profile['language_history'])}")
-        st.write(f"- Last language: {user_profile['last_session']['language']}")
-        st.write(f"- Last level: {user_profile['last_session']['level']}")
+        st.write(f"- Created: {profile['created_at']}")
+        st.write(f"- Languages studied: {len(profile['language_history'])}")
+        st.write(f"- Last language: {profile['last_session']['language']}")
+        st.write(f"- Last level: {profile['last_session']['level']}")
         
         # Check for existing memories
-        memories = load_memories("", user_id=user_id_input)
+        memories = memory_preview(st.session_state.user_id)
         if memories:
             st.write(f"#### Found {len(memories)} memories")
             with st.expander("View memories"):
@@ -83,8 +289,9 @@ with st.sidebar:
                     st.write(f"{i+1}. {memory[:100]}...")
         else:
             st.warning("No memories found for this user ID.")
-        
-        st.rerun()
+
+with st.sidebar:
+    user_id_panel()
 
 ########################################################
 # Main Interface
@@ -103,32 +310,27 @@ st.warning("⚠️ **Important: Save Your User ID**\n\nYour User ID is how the a
 col1, col2 = st.columns(2)
 
 with col1:
-    # Language selection
-    languages = [
-        "English", "French", "Spanish", "German", 
-        "Portuguese", "Thai", "Polish", "Russian"
-    ]
     # Use last selected language as default if available
     default_lang_index = 0
-    if user_profile["last_session"]["language"] in languages:
-        default_lang_index = languages.index(user_profile["last_session"]["language"])
+    if user_profile["last_session"]["language"] in LANGUAGES:
+        default_lang_index = LANGUAGES.index(user_profile["last_session"]["language"])
     
-    selected_language = st.selectbox("I want to learn:", languages, index=default_lang_index)
+    selected_language = st.selectbox("I want to learn:", LANGUAGES, index=default_lang_index)
 
 with col2:
-    # CEFR Proficiency level
-    levels = ["A1 (Beginner)", "A2 (Elementary)", "B1 (Intermediate)", 
-             "B2 (Upper Intermediate)", "C1 (Advanced)"]
     # Use last selected level as default if available
     default_level_index = 0
-    if user_profile["last_session"]["level"] in levels:
-        default_level_index = levels.index(user_profile["last_session"]["level"])
+    if user_profile["last_session"]["level"] in LEVELS:
+        default_level_index = LEVELS.index(user_profile["last_session"]["level"])
     
-    selected_level = st.selectbox("My current level:", levels, index=default_level_index)
+    selected_level = st.selectbox("My current level:", LEVELS, index=default_level_index)
 
 # Extract the CEFR level code
 cefr_level = selected_level.split()[0]
 
+# Local CEFR word index for the language, if one has been built
+lexicon = lexicons.get(selected_language)
+
 # Start conversation button
 start_conversation = st.button("Start Learning", use_container_width=True)
 
@@ -157,59 +359,52 @@ if start_conversation and not st.session_state.conversation_started:
     # Save updated profile
     save_user_profile(st.session_state.user_id, user_profile)
     
-    # Save a memory about session start
-    save_memory(f"User started learning {selected_language} at {selected_level} level.", user_id=st.session_state.user_id)
+    # Save the session start memory and build the system prompts in the background,
+    # so memory retrieval is off the critical path by the time a mode is chosen
+    prefetcher.start(
+        st.session_state.user_id, selected_language, selected_level,
+        start_memory=f"User started learning {selected_language} at {selected_level} level."
+    )
     
-    # Initialize conversation
+    # Initialize conversation; the system prompt is filled in when a mode is selected
     st.session_state.messages = [
-        {"role": "system", "content": get_system_prompt("", user_id=st.session_state.user_id)},
+        {"role": "system", "content": ""},
         {"role": "assistant", "content": welcome_message}
     ]
+    st.session_state.pop("history_cache", None)
+    st.session_state.pop("vocabulary_cache", None)
+    session_store.replace_messages(st.session_state.user_id, st.session_state.messages)
     st.session_state.conversation_started = True
     st.session_state.lesson_ended = False
     st.session_state.lesson_score = None
+    persist_state()
     st.rerun()
 
 ########################################################
 # Chat Interface
 ########################################################
-# Display conversation if started
-if st.session_state.get('messages', []) and st.session_state.conversation_started:
+@st.fragment
+def chat_panel(selected_language, selected_level, cefr_level, lexicon):
+    """
+    The conversation, mode selection and lesson controls.
+    
+    Sending a chat message only reruns this fragment; changes that affect the
+    rest of the page (choosing a mode, ending or resetting the lesson) rerun
+    the whole app.
+    """
+    user_profile = get_user_profile()
+    
     # Show all messages except the system prompt
-    for msg in st.session_state.messages[1:]:
-        st.chat_message(msg["role"]).write(msg["content"])
+    render_history()
 
     # Show practice mode selection if not yet selected
     if not st.session_state.mode_selected:
         st.write("Choose a practice mode:")
         
-        col1, col2, col3 = st.columns(3)
         last_mode = user_profile["last_session"]["mode"]
         
-        # Define a helper function for handling mode selection
-        def handle_mode_selection(mode_type, column):
-            mode_data = {
-                "conversation": {
-                    "message": "I'd like to practice conversation.",
-                    "response_func": get_conversation_response,
-                    "prompt_func": get_conversation_mode_prompt,
-                    "button_text": "Conversation Practice"
-                },
-                "grammar": {
-                    "message": "I'd like to practice grammar.",
-                    "response_func": get_grammar_response,
-                    "prompt_func": get_grammar_mode_prompt,
-                    "button_text": "Grammar Exercises"
-                },
-                "vocabulary": {
-                    "message": "I'd like to build my vocabulary.",
-                    "response_func": get_vocabulary_response,
-                    "prompt_func": get_vocabulary_mode_prompt,
-                    "button_text": "Vocabulary Building"
-                }
-            }
-            
-            data = mode_data[mode_type]
+        # Create buttons for each mode
+        for column, (mode_type, data) in zip(st.columns(len(PRACTICE_MODES)), PRACTICE_MODES.items()):
             with column:
                 if st.button(data["button_text"], use_container_width=True, 
                             disabled=last_mode==mode_type and st.session_state.mode_selected):
@@ -218,24 +413,19 @@ if st.session_state.get('messages', []) and st.session_state.conversation_starte
                     mode_response = data["response_func"](selected_language, cefr_level)
                     
                     # Update conversation
-                    st.session_state.messages.append({"role": "user", "content": mode_message})
-                    st.session_state.messages.append({"role": "assistant", "content": mode_response})
+                    add_message("user", mode_message)
+                    add_message("assistant", mode_response)
                     
-                    # Update system prompt
-                    system_prompt = st.session_state.messages[0]["content"]
-                    enhanced_prompt = data["prompt_func"](selected_language, cefr_level, system_prompt)
-                    st.session_state.messages[0]["content"] = enhanced_prompt
+                    # Use the mode prompt prepared in the background at lesson start
+                    prompts = prefetcher.get(st.session_state.user_id, selected_language, selected_level)
+                    set_system_prompt(prompts["modes"][mode_type])
                     
                     # Update user profile and state
                     user_profile["last_session"]["mode"] = mode_type
                     save_user_profile(st.session_state.user_id, user_profile)
                     st.session_state.mode_selected = True
+                    persist_state()
                     st.rerun()
-        
-        # Create buttons for each mode
-        handle_mode_selection("conversation", col1)
-        handle_mode_selection("grammar", col2)
-        handle_mode_selection("vocabulary", col3)
 
     # User input chat interface (only shown when mode is selected)
     if st.session_state.mode_selected and not st.session_state.lesson_ended:
@@ -246,21 +436,41 @@ if st.session_state.get('messages', []) and st.session_state.conversation_starte
             system_prompt = get_system_prompt(prompt, user_id=st.session_state.user_id)
             existing_prompt = st.session_state.messages[0]["content"]
             language_context = existing_prompt.split("The user is learning")[1] if "The user is learning" in existing_prompt else f"The user is learning {selected_language} at {cefr_level} level."
+            language_context = language_context.split("\nVocabulary check:")[0]
+            
+            # Flag words above the user's level without spending a model call on it
+            if lexicon:
+                message_profile = lexicon.level_profile(prompt, target_level=cefr_level)
+                if message_profile["above_target"]:
+                    above_words = ", ".join(message_profile["above_target"][:10])
+                    language_context += f"\nVocabulary check: the user's last message used words above {cefr_level}: {above_words}."
             
             # Update system prompt
-            st.session_state.messages[0]["content"] = f"{system_prompt}\n{language_context}"
+            set_system_prompt(f"{system_prompt}\n{language_context}")
             
             # Add user message to conversation
-            st.session_state.messages.append({"role": "user", "content": prompt})
+            add_message("user", prompt)
             st.chat_message("user").write(prompt)
             
             # Get AI response
             with st.spinner("Thinking..."):
-                response = agent(st.session_state.messages, user_id=st.session_state.user_id)
+                response = agent(st.session_state.messages, user_id=st.session_state.user_id, language=selected_language)
             
             # Add AI response to conversation
-            st.session_state.messages.append({"role": "assistant", "content": response})
+            add_message("assistant", response)
             st.chat_message("assistant").write(response)
+    
+    # Vocabulary level of the user's own messages, from the local lexicon
+    if st.session_state.mode_selected and lexicon:
+        vocabulary_profile = lesson_vocabulary_profile(lexicon, cefr_level)
+        if vocabulary_profile["known"]:
+            level_summary = (
+                f"Your vocabulary this lesson: {vocabulary_profile['estimated_level'] or '-'} "
+                f"({vocabulary_profile['known']} of {vocabulary_profile['words']} words recognised)"
+            )
+            if vocabulary_profile["above_target"]:
+                level_summary += f". Above {cefr_level}: {', '.join(vocabulary_profile['above_target'][:10])}"
+            st.caption(level_summary)
         
     # Display lesson score and summary if lesson has ended
     if st.session_state.lesson_ended:
@@ -275,25 +485,6 @@ if st.session_state.get('messages', []) and st.session_state.conversation_starte
                 st.success("Lesson completed! See your evaluation above.")
         else:
             st.success("Lesson completed! See your evaluation above.")
-        
-        # Option to review progress in sidebar
-        if "lesson_history" in user_profile and len(user_profile["lesson_history"]) > 1:
-            with st.sidebar:
-                st.divider()
-                st.subheader("Learning Progress")
-                lesson_count = len(user_profile["lesson_history"])
-                
-                # Calculate average score
-                scores = [lesson.get("score", 0) for lesson in user_profile["lesson_history"] if lesson.get("score")]
-                avg_score = sum(scores) / len(scores) if scores else 0
-                
-                st.write(f"Total lessons: {lesson_count}")
-                st.write(f"Average score: {avg_score:.1f}/10")
-                
-                # Show last 5 lessons
-                st.write("Recent lessons:")
-                for lesson in user_profile["lesson_history"][-5:]:
-                    st.write(f"- {lesson['language']} ({lesson['level']}): {lesson.get('score', 'N/A')}/10")
     
     # Action buttons at the bottom
     st.divider()
@@ -307,22 +498,22 @@ if st.session_state.get('messages', []) and st.session_state.conversation_starte
         with col1:
             st.info("👨‍🏫 When done with your lesson, click for feedback and a score")
             if st.button("End Lesson", use_container_width=True):
+                # Profile the lesson's vocabulary before the evaluation request joins the transcript
+                vocabulary_level = lesson_vocabulary_profile(lexicon, cefr_level)["estimated_level"] if lexicon else None
+                
                 # Add message to get scoring and feedback
-                st.session_state.messages.append({
-                    "role": "user", 
-                    "content": "Please evaluate my performance in this lesson. Give me a score out of 10 and a brief summary of what I did well and what I can improve on."
-                })
+                add_message("user", EVALUATION_REQUEST)
                 
                 # Get AI response with score and summary
                 with st.spinner("Evaluating your lesson..."):
                     # Update system prompt to instruct AI to provide scoring
                     score_instruction = "\nNow provide a genuine assessment of the user's performance. Give a score out of 10 and a concise summary of strengths and areas for improvement."
-                    st.session_state.messages[0]["content"] += score_instruction
+                    set_system_prompt(st.session_state.messages[0]["content"] + score_instruction)
                     
-                    evaluation = agent(st.session_state.messages, user_id=st.session_state.user_id)
+                    evaluation = agent(st.session_state.messages, user_id=st.session_state.user_id, language=selected_language)
                 
                 # Save evaluation as last response
-                st.session_state.messages.append({"role": "assistant", "content": evaluation})
+                add_message("assistant", evaluation)
                 
                 # Extract score using simple heuristic (first number out of 10 mentioned)
                 import re
@@ -332,6 +523,7 @@ if st.session_state.get('messages', []) and st.session_state.conversation_starte
                 # Update session state
                 st.session_state.lesson_ended = True
                 st.session_state.lesson_score = score
+                persist_state()
                 
                 # Save lesson summary to user profile
                 if "lesson_history" not in user_profile:
@@ -342,12 +534,13 @@ if st.session_state.get('messages', []) and st.session_state.conversation_starte
                     "level": selected_level,
                     "mode": user_profile["last_session"]["mode"],
                     "score": score,
+                    "vocabulary_level": vocabulary_level,
                     "summary": evaluation,
                     "timestamp": datetime.now().isoformat()
                 })
                 
                 # Save memory about lesson completion
-                save_memory(
+                save_memory_async(
                     f"User completed a {user_profile['last_session']['mode']} lesson in {selected_language} at {selected_level} level with a score of {score}/10.",
                     user_id=st.session_state.user_id
                 )
@@ -361,22 +554,69 @@ if st.session_state.get('messages', []) and st.session_state.conversation_starte
         with col2:
             st.info("👇 Click to change language, level, or practice mode")
             if st.button("Reset Conversation", use_container_width=True):
-                st.session_state.messages = []
-                st.session_state.conversation_started = False
-                st.session_state.mode_selected = False
-                st.session_state.lesson_ended = False
-                st.session_state.lesson_score = None
+                reset_conversation()
                 st.rerun()
     else:
         # Just show the Reset Conversation button
         st.info("👇 Click the button below if you wish to change your language, level, or practice mode.")
         if st.button("Reset Conversation", use_container_width=True):
-            st.session_state.messages = []
-            st.session_state.conversation_started = False
-            st.session_state.mode_selected = False
-            st.session_state.lesson_ended = False
-            st.session_state.lesson_score = None
+            reset_conversation()
             st.rerun()
+
+@st.fragment
+def vocabulary_review_panel(selected_language):
+    """Spaced-repetition drill for vocabulary mode, graded locally without a model call."""
+    deck_stats = srs.stats(st.session_state.user_id, selected_language)
+    st.divider()
+    st.subheader("Vocabulary Review")
+    st.write(f"{deck_stats['due']} of {deck_stats['total']} words due")
+    
+    due_cards = srs.due_cards(st.session_state.user_id, selected_language, limit=1)
+    if due_cards:
+        card = due_cards[0]
+        st.markdown(f"### {card.word}")
+        if card.translation and st.checkbox("Show translation", key=f"reveal_{card.word}"):
+            st.write(card.translation)
+        
+        grade_cols = st.columns(len(GRADES))
+        for grade_col, grade in zip(grade_cols, GRADES):
+            with grade_col:
+                # Recorded in a callback so the fragment's own rerun already shows the next card
+                st.button(grade.capitalize(), key=f"grade_{grade}", use_container_width=True,
+                          on_click=srs.record_answer,
+                          args=(st.session_state.user_id, selected_language, card.word, grade))
+    else:
+        st.caption("No words due. New words from this lesson will appear here.")
+
+def progress_panel(user_profile):
+    """Summary of past lessons, rendered from the profile held in session state."""
+    st.divider()
+    st.subheader("Learning Progress")
+    lesson_count = len(user_profile["lesson_history"])
+    
+    # Calculate average score
+    scores = [lesson.get("score", 0) for lesson in user_profile["lesson_history"] if lesson.get("score")]
+    avg_score = sum(scores) / len(scores) if scores else 0
+    
+    st.write(f"Total lessons: {lesson_count}")
+    st.write(f"Average score: {avg_score:.1f}/10")
+    
+    # Show last 5 lessons
+    st.write("Recent lessons:")
+    for lesson in user_profile["lesson_history"][-5:]:
+        st.write(f"- {lesson['language']} ({lesson['level']}): {lesson.get('score', 'N/A')}/10")
+
+# Display conversation if started
+if st.session_state.get('messages', []) and st.session_state.conversation_started:
+    chat_panel(selected_language, selected_level, cefr_level, lexicon)
+    
+    with st.sidebar:
+        if st.session_state.mode_selected and user_profile["last_session"]["mode"] == "vocabulary":
+            vocabulary_review_panel(selected_language)
+        
+        # Option to review progress in sidebar
+        if st.session_state.lesson_ended and len(user_profile.get("lesson_history", [])) > 1:
+            progress_panel(user_profile)
 elif not start_conversation:
     # Initial instruction for users
     st.info("👆 Select your language and level, then click 'Start Learning' to begin your conversation.")
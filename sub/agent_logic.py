@@ -1,22 +1,32 @@
 import json
 import streamlit as st
-from openai import OpenAI
-from sub.tools import save_memory, TOOLS
+from openai import OpenAI, OpenAIError
+from sub.tools import save_memory_async, TOOLS, OPENAI_TIMEOUT, scheduler, srs
+from sub.resilience import CircuitOpenError, get_breaker
+from sub.scheduler import SchedulerOverloaded, scheduling
+from sub.logging_setup import get_logger, redact
+
+logger = get_logger("agent")
+
+# Shown instead of a reply while the chat model is failing or the app is overloaded
+UNAVAILABLE_MESSAGE = "Sorry, I'm having trouble connecting right now. Please try again in a moment."
 
 # Initialize the OpenAI client with API key from Streamlit secrets
-def agent(messages, user_id="1234"):
+def agent(messages, user_id="1234", language=None):
     """
     Process messages through the OpenAI model and handle tool calls.
     
     Args:
         messages (list): List of message objects with role and content
         user_id (str): The unique identifier for the user, used for memory storage/retrieval
+        language (str): The language being learned, used for the vocabulary review deck
         
     Returns:
         str: The assistant's response or result of a tool call
     """
     # Initialize the OpenAI client
-    client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+    client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"], timeout=OPENAI_TIMEOUT, max_retries=1)
+    chat_breaker = get_breaker("chat")
     
     # Extract the last user message for context
     last_user_message = ""
@@ -27,22 +37,32 @@ def agent(messages, user_id="1234"):
     
     # Automatically save important interactions to memory
     if last_user_message and len(last_user_message) > 5:
-        # Save this interaction to memory without altering the conversation flow
+        # Save this interaction to memory in the background, without delaying the reply
         try:
             # Only save substantial messages that likely contain meaningful content
             if len(last_user_message.split()) > 3:
                 memory_text = f"User said: {last_user_message}"
-                save_memory(memory_text, user_id=user_id)
+                save_memory_async(memory_text, user_id=user_id)
         except Exception as e:
             # Silently handle any errors to not disrupt the conversation
-            print(f"Memory saving error (non-critical): {str(e)}")
+            logger.warning("Memory saving error (non-critical): %s", e)
     
-    # Make a ChatGPT API call with tool calling
-    completion = client.chat.completions.create(
-        model="gpt-4o-mini",  # You can change this to another model if needed
-        tools=TOOLS,  # Here we pass the tools to the LLM
-        messages=messages
-    )
+    # Make a ChatGPT API call with tool calling, failing fast if the API keeps erroring
+    try:
+        with scheduling(user_id, priority="interactive"):
+            completion = scheduler.run(
+                chat_breaker.call,
+                client.chat.completions.create,
+                model="gpt-4o-mini",  # You can change this to another model if needed
+                tools=TOOLS,  # Here we pass the tools to the LLM
+                messages=messages
+            )
+    except (CircuitOpenError, SchedulerOverloaded):
+        return UNAVAILABLE_MESSAGE
+    except OpenAIError as e:
+        # Errors before the breaker opens would otherwise surface as a stack trace
+        logger.error("Chat completion failed: %s", e)
+        return UNAVAILABLE_MESSAGE
     
     # Get the response from the LLM
     response = completion.choices[0].message
@@ -51,13 +71,14 @@ def agent(messages, user_id="1234"):
     if response.content and len(response.content) > 20:
         try:
             memory_text = f"Assistant responded: {response.content[:200]}..."
-            save_memory(memory_text, user_id=user_id)
+            save_memory_async(memory_text, user_id=user_id)
         except Exception as e:
             # Silently handle any errors to not disrupt the conversation
-            print(f"Memory saving error (non-critical): {str(e)}")
+            logger.warning("Memory saving error (non-critical): %s", e)
     
     # Parse the response to get the tool call arguments
     if response.tool_calls:
+        saved = []
         # Process each tool call
         for tool_call in response.tool_calls:
             # Get the tool call arguments
@@ -67,27 +88,46 @@ def agent(messages, user_id="1234"):
             if tool_call.function.name == "save_memory":
                 # Instead of returning the save_memory result, silently save the memory
                 try:
-                    save_memory(tool_call_arguments["memory"], user_id=user_id)
-                    print(f"Memory saved: {tool_call_arguments['memory'][:50]}...")
+                    save_memory_async(tool_call_arguments["memory"], user_id=user_id)
+                    logger.debug("Memory queued by tool call: %s", redact(tool_call_arguments["memory"]))
+                except Exception as e:
+                    logger.error("Error saving memory: %s", e)
+                saved.append("memory")
+            elif tool_call.function.name == "save_vocabulary":
+                # Add the words to the learner's spaced-repetition deck for local drills
+                try:
+                    if language:
+                        srs.add_words(user_id, language, tool_call_arguments.get("words", []))
                 except Exception as e:
-                    print(f"Error saving memory: {str(e)}")
-                
-                # Make a follow-up call to get a proper response from the assistant
-                # First add a system message explaining the memory was saved successfully
-                follow_up_messages = messages.copy()
-                follow_up_messages.append({
-                    "role": "system", 
-                    "content": "The memory has been saved successfully. Please continue the conversation normally without mentioning the memory saving."
-                })
-                
-                # Request a new response that's actually for the user
-                new_completion = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=follow_up_messages
-                )
-                
-                # Return the new, user-friendly response
-                return new_completion.choices[0].message.content
+                    logger.error("Error saving vocabulary: %s", e)
+                saved.append("vocabulary")
+        
+        if saved:
+            # Make a follow-up call to get a proper response from the assistant
+            # First add a system message explaining the tool calls succeeded
+            follow_up_messages = messages.copy()
+            follow_up_messages.append({
+                "role": "system", 
+                "content": f"The {' and '.join(saved)} has been saved successfully. Please continue the conversation normally without mentioning the saving."
+            })
+            
+            # Request a new response that's actually for the user
+            try:
+                with scheduling(user_id, priority="interactive"):
+                    new_completion = scheduler.run(
+                        chat_breaker.call,
+                        client.chat.completions.create,
+                        model="gpt-4o-mini",
+                        messages=follow_up_messages
+                    )
+            except (CircuitOpenError, SchedulerOverloaded):
+                return UNAVAILABLE_MESSAGE
+            except OpenAIError as e:
+                logger.error("Follow-up chat completion failed: %s", e)
+                return UNAVAILABLE_MESSAGE
+            
+            # Return the new, user-friendly response
+            return new_completion.choices[0].message.content
     
     # If there are no tool calls, return the response content
     return response.content
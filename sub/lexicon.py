@@ -0,0 +1,500 @@
+import os
+import re
+import mmap
+import struct
+import threading
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+from sub.logging_setup import get_logger
+
+logger = get_logger("lexicon")
+
+LEVELS = ("A1", "A2", "B1", "B2", "C1", "C2")
+PARTS_OF_SPEECH = ("other", "noun", "verb", "adj", "adv", "pron", "det", "prep", "conj", "num", "intj")
+
+LexiconEntry = namedtuple("LexiconEntry", ["lemma", "level", "rank", "pos"])
+
+# File layout: header, fixed-size entry table sorted by key bytes, then the UTF-8 key blob
+_MAGIC = b"CEFRLEX1"
+_HEADER = struct.Struct("<8sII")      # magic, entry count, key blob offset
+_ENTRY = struct.Struct("<IIIHBB")     # key offset, lemma entry index, frequency rank, key length, level, pos
+_KEY_REF = struct.Struct("<I8xH")     # just the key offset and length, for the binary search
+
+# Letters plus Thai vowel and tone marks, which are combining characters rather than \w
+_WORD_PATTERN = re.compile(r"(?:[^\W\d_]|[\u0e31\u0e34-\u0e3a\u0e47-\u0e4e])+")
+_THAI_PATTERN = re.compile(r"[\u0e00-\u0e7f]+")
+
+# Suffix rewrites tried in order when a word isn't in the lexicon as written.
+# A candidate only counts if the lexicon has it, so over-generating is harmless;
+# irregular forms belong in the word list's forms column instead.
+SUFFIX_RULES = {
+    "english": [
+        ("ies", "y"), ("ied", "y"), ("ying", "ie"), ("ves", "f"), ("ves", "fe"),
+        ("ing", ""), ("ing", "e"), ("ed", ""), ("ed", "e"), ("es", ""), ("s", ""),
+        ("er", ""), ("est", ""), ("ly", ""),
+    ],
+    "french": [
+        ("aux", "al"), ("euse", "eux"), ("ive", "if"), ("ées", "er"), ("és", "er"), ("ée", "er"), ("é", "er"),
+        ("eons", "er"), ("eant", "er"), ("ions", "er"), ("iez", "er"), ("aient", "er"), ("ait", "er"), ("ais", "er"), ("ons", "er"),
+        ("ez", "er"), ("ent", "er"), ("ant", "er"), ("es", "er"), ("e", "er"),
+        ("issons", "ir"), ("issez", "ir"), ("issent", "ir"), ("it", "ir"), ("is", "ir"),
+        ("es", ""), ("s", ""), ("x", ""), ("e", ""),
+    ],
+    "spanish": [
+        ("ando", "ar"), ("iendo", "er"), ("iendo", "ir"), ("ado", "ar"), ("ada", "ar"), ("ido", "er"), ("ido", "ir"),
+        ("amos", "ar"), ("emos", "er"), ("imos", "ir"), ("áis", "ar"), ("éis", "er"), ("ís", "ir"),
+        ("as", "ar"), ("an", "ar"), ("es", "er"), ("en", "er"), ("en", "ir"), ("o", "ar"), ("o", "er"), ("o", "ir"),
+        ("a", "ar"), ("e", "er"), ("e", "ir"),
+        ("ces", "z"), ("es", ""), ("s", ""), ("as", "o"), ("os", "o"), ("a", "o"),
+    ],
+    "german": [
+        ("test", "en"), ("tet", "en"), ("ten", "en"), ("te", "en"), ("st", "en"), ("t", "en"), ("e", "en"),
+        ("ern", ""), ("en", ""), ("er", ""), ("es", ""), ("em", ""), ("e", ""), ("n", ""), ("s", ""),
+    ],
+    "portuguese": [
+        ("ões", "ão"), ("ães", "ão"), ("ais", "al"),
+        ("ando", "ar"), ("endo", "er"), ("indo", "ir"), ("ado", "ar"), ("ada", "ar"), ("ido", "er"), ("ido", "ir"),
+        ("amos", "ar"), ("emos", "er"), ("imos", "ir"), ("ei", "ar"), ("ou", "ar"),
+        ("as", "ar"), ("am", "ar"), ("es", "er"), ("em", "er"), ("o", "ar"), ("o", "er"), ("o", "ir"),
+        ("a", "ar"), ("e", "er"), ("e", "ir"),
+        ("es", ""), ("s", ""), ("as", "o"), ("os", "o"), ("a", "o"),
+    ],
+    "polish": [
+        ("ego", "y"), ("emu", "y"), ("ej", "y"), ("ych", "y"), ("ymi", "y"), ("ym", "y"), ("a", "y"), ("e", "y"), ("ą", "y"),
+        ("ego", "i"), ("iej", "i"), ("ich", "i"), ("imi", "i"), ("im", "i"),
+        ("am", "ać"), ("asz", "ać"), ("amy", "ać"), ("acie", "ać"), ("ają", "ać"), ("ał", "ać"), ("ała", "ać"),
+        ("ę", "ć"), ("esz", "ć"), ("e", "ć"), ("emy", "ć"), ("ecie", "ć"), ("ą", "ć"), ("ł", "ć"), ("ła", "ć"),
+        ("ami", ""), ("ach", ""), ("ów", ""), ("owi", ""), ("om", ""), ("em", ""), ("ie", ""), ("y", ""), ("i", ""), ("u", ""), ("a", ""),
+        ("ami", "a"), ("ach", "a"), ("om", "a"), ("ie", "a"), ("ę", "a"), ("ą", "a"), ("y", "a"), ("i", "a"),
+    ],
+    "russian": [
+        ("ого", "ый"), ("ому", "ый"), ("ым", "ый"), ("ом", "ый"), ("ая", "ый"), ("ую", "ый"), ("ой", "ый"),
+        ("ые", "ый"), ("ых", "ый"), ("ыми", "ый"),
+        ("его", "ий"), ("ему", "ий"), ("им", "ий"), ("яя", "ий"), ("юю", "ий"), ("ие", "ий"), ("их", "ий"),
+        ("ю", "ть"), ("ешь", "ть"), ("ет", "ть"), ("ем", "ть"), ("ете", "ть"), ("ют", "ть"),
+        ("ишь", "ть"), ("ит", "ть"), ("им", "ть"), ("ите", "ть"), ("ят", "ть"), ("ат", "ть"),
+        ("л", "ть"), ("ла", "ть"), ("ло", "ть"), ("ли", "ть"),
+        ("ами", ""), ("ами", "а"), ("ах", ""), ("ах", "а"), ("ов", ""), ("ей", ""), ("ей", "ь"),
+        ("ом", ""), ("ам", ""), ("ам", "а"), ("ы", ""), ("ы", "а"), ("и", "ь"), ("и", "а"), ("и", "я"),
+        ("у", ""), ("у", "а"), ("ю", "я"), ("е", ""), ("е", "а"), ("а", ""), ("я", "ь"),
+    ],
+    "thai": [],
+}
+
+def normalize_word(word):
+    """Lowercase and NFC-normalize a word so lookups match the built keys."""
+    return unicodedata.normalize("NFC", word).lower()
+
+def _level_code(level):
+    level = (level or "").strip().upper()[:2]
+    return LEVELS.index(level) + 1 if level in LEVELS else 0
+
+def _pos_code(pos):
+    pos = (pos or "").strip().lower()
+    return PARTS_OF_SPEECH.index(pos) if pos in PARTS_OF_SPEECH else 0
+
+#######################################
+# Building
+#######################################
+def read_word_list(path):
+    """
+    Read a tab-separated CEFR word list.
+
+    Each line is "lemma<TAB>level<TAB>rank<TAB>pos[<TAB>forms]" where forms is
+    an optional comma-separated list of irregular inflections. Blank lines,
+    lines starting with "#" and a "lemma" header line are skipped.
+
+    Args:
+        path (str): Path to the .tsv file
+
+    Yields:
+        tuple: (lemma, level, rank, pos, forms)
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#") or line.lower().startswith("lemma\t"):
+                continue
+            fields = line.split("\t")
+            if len(fields) < 3:
+                logger.warning(f"Skipping malformed line {line_number} in {path}")
+                continue
+            lemma, level, rank = fields[0], fields[1], fields[2]
+            pos = fields[3] if len(fields) > 3 else ""
+            forms = [form for form in fields[4].split(",") if form.strip()] if len(fields) > 4 else []
+            try:
+                rank = int(rank)
+            except ValueError:
+                logger.warning(f"Skipping line {line_number} in {path}: bad rank {rank!r}")
+                continue
+            yield lemma, level, rank, pos, forms
+
+def build_lexicon(rows, path):
+    """
+    Write a lexicon index file from word list rows.
+
+    When a lemma appears more than once the entry with the lowest level (then
+    the most frequent) wins, so a word is rated by its most basic sense; the
+    irregular forms of every entry are kept.
+
+    Args:
+        rows (iterable): (lemma, level, rank, pos, forms) tuples, e.g. from read_word_list()
+        path (str): Where to write the .lex file
+
+    Returns:
+        int: Number of lemmas written
+    """
+    lemmas = {}
+    for lemma, level, rank, pos, forms in rows:
+        key = normalize_word(lemma.strip())
+        if not key:
+            continue
+        record = (_level_code(level) or len(LEVELS) + 1, rank, _pos_code(pos), list(forms))
+        if key in lemmas:
+            if record[:2] >= lemmas[key][:2]:
+                lemmas[key][3].extend(forms)
+                continue
+            record[3].extend(lemmas[key][3])
+        lemmas[key] = record
+
+    # Inflected forms point at their lemma; a form never shadows a real lemma
+    keys = {key.encode("utf-8"): key for key in lemmas}
+    forms = {}
+    for key, (_, _, _, lemma_forms) in lemmas.items():
+        for form in lemma_forms:
+            form_key = normalize_word(form.strip())
+            encoded = form_key.encode("utf-8")
+            if form_key and encoded not in keys and encoded not in forms:
+                forms[encoded] = key
+
+    ordered = sorted(list(keys) + list(forms))
+    position = {encoded: i for i, encoded in enumerate(ordered)}
+
+    blob = bytearray()
+    table = bytearray()
+    for encoded in ordered:
+        lemma_key = keys.get(encoded) or forms[encoded]
+        level, rank, pos, _ = lemmas[lemma_key]
+        level = 0 if level > len(LEVELS) else level
+        table += _ENTRY.pack(len(blob), position[lemma_key.encode("utf-8")], rank, len(encoded), level, pos)
+        blob += encoded
+
+    tmp_path = f"{path}.tmp"
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, len(ordered), _HEADER.size + len(table)))
+        f.write(table)
+        f.write(blob)
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote {len(lemmas)} lemmas and {len(forms)} forms to {path}")
+    return len(lemmas)
+
+#######################################
+# Level Profiles
+#######################################
+def _summarize_levels(words, known, counts, above):
+    """Build a level profile dict from word counts, estimating the text's level."""
+    estimated = None
+    covered = 0
+    for level in LEVELS:
+        covered += counts[level]
+        if known and covered / known >= 0.9:
+            estimated = level
+            break
+    return {
+        "words": words,
+        "known": known,
+        "coverage": known / words if words else 0.0,
+        "levels": counts,
+        "estimated_level": estimated,
+        "above_target": above,
+    }
+
+def merge_level_profiles(first, second):
+    """
+    Combine two level profiles as if their texts had been profiled together.
+
+    Lets a caller keep a running profile of a growing text and only profile
+    what was added.
+
+    Args:
+        first (dict): Profile from Lexicon.level_profile() of the earlier text
+        second (dict): Profile of the text that follows, with the same target_level
+
+    Returns:
+        dict: The combined profile
+    """
+    counts = {level: first["levels"][level] + second["levels"][level] for level in LEVELS}
+    above = first["above_target"] + [lemma for lemma in second["above_target"] if lemma not in first["above_target"]]
+    return _summarize_levels(first["words"] + second["words"], first["known"] + second["known"], counts, above)
+
+#######################################
+# Lookup
+#######################################
+class Lexicon:
+    """
+    Read-only CEFR lexicon backed by a memory-mapped sorted array.
+
+    Lookups binary-search the fixed-size entry table and compare keys straight
+    from the mapped file, so opening a lexicon costs nothing up front, the OS
+    shares its pages between worker processes, and a lookup is O(log n).
+    Words not found as written are lemmatized with the language's suffix
+    rules, and results are cached since learner messages repeat words a lot.
+    """
+
+    def __init__(self, path, language):
+        self.path = path
+        self.language = language.lower()
+        self.rules = SUFFIX_RULES.get(self.language, [])
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self._keys_offset = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a lexicon index")
+        self._max_key_length = 0
+        self._by_level = {}
+        self.lookup = lru_cache(maxsize=50000)(self._lookup)
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _raw(self, i):
+        return _ENTRY.unpack_from(self._map, _HEADER.size + i * _ENTRY.size)
+
+    def _key(self, i):
+        key_offset, key_length = _KEY_REF.unpack_from(self._map, _HEADER.size + i * _ENTRY.size)
+        start = self._keys_offset + key_offset
+        return self._map[start:start + key_length]
+
+    def _find(self, key):
+        """Return the entry index for an encoded key, or -1."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.count and self._key(lo) == key:
+            return lo
+        return -1
+
+    def _entry(self, i):
+        _, lemma_index, rank, _, level, pos = self._raw(i)
+        return LexiconEntry(
+            lemma=self._key(lemma_index).decode("utf-8"),
+            level=LEVELS[level - 1] if level else None,
+            rank=rank,
+            pos=PARTS_OF_SPEECH[pos],
+        )
+
+    def _candidates(self, word):
+        yield word
+        for suffix, replacement in self.rules:
+            if len(word) > len(suffix) + 1 and word.endswith(suffix):
+                stem = word[:-len(suffix)]
+                yield stem + replacement
+                # running -> runn -> run
+                if not replacement and len(stem) > 2 and stem[-1] == stem[-2]:
+                    yield stem[:-1]
+
+    def _lookup(self, word):
+        word = normalize_word(word)
+        for candidate in self._candidates(word):
+            i = self._find(candidate.encode("utf-8"))
+            if i >= 0:
+                return self._entry(i)
+        return None
+
+    def tokenize(self, text):
+        """
+        Split text into words, segmenting Thai by longest dictionary match.
+
+        Args:
+            text (str): The text to split
+
+        Returns:
+            list: Word strings in order
+        """
+        tokens = []
+        for token in _WORD_PATTERN.findall(text):
+            if self.language == "thai" and _THAI_PATTERN.fullmatch(token):
+                tokens.extend(self._segment(token))
+            else:
+                tokens.append(token)
+        return tokens
+
+    def _segment(self, run):
+        if not self._max_key_length:
+            self._max_key_length = max((self._raw(i)[3] for i in range(self.count)), default=1)
+        # Thai characters are 3 bytes in UTF-8
+        longest = max(1, self._max_key_length // 3)
+        tokens = []
+        start = 0
+        while start < len(run):
+            for end in range(min(len(run), start + longest), start, -1):
+                if end - start == 1 or self._find(run[start:end].encode("utf-8")) >= 0:
+                    tokens.append(run[start:end])
+                    start = end
+                    break
+        return tokens
+
+    def annotate(self, text):
+        """
+        Look up every word in a piece of text.
+
+        Args:
+            text (str): A user message or generated text
+
+        Returns:
+            list: (word, LexiconEntry or None) pairs in order
+        """
+        return [(token, self.lookup(token)) for token in self.tokenize(text)]
+
+    def level_profile(self, text, target_level=None):
+        """
+        Summarise the CEFR levels of the vocabulary in a piece of text.
+
+        The estimated level is the lowest level whose words, together with
+        all easier ones, cover at least 90% of the recognised words.
+
+        Args:
+            text (str): The text to profile
+            target_level (str): Optional level, e.g. "B1", to list words above
+
+        Returns:
+            dict: Word and recognised counts, per-level counts, coverage,
+                  estimated level and the lemmas above target_level
+        """
+        counts = {level: 0 for level in LEVELS}
+        words = 0
+        known = 0
+        above = []
+        target = _level_code(target_level)
+        for _, entry in self.annotate(text):
+            words += 1
+            if entry is None or entry.level is None:
+                continue
+            known += 1
+            counts[entry.level] += 1
+            if target and LEVELS.index(entry.level) + 1 > target and entry.lemma not in above:
+                above.append(entry.lemma)
+        return _summarize_levels(words, known, counts, above)
+
+    def words_at_level(self, level, pos=None, limit=20, exclude=()):
+        """
+        Suggest the most frequent lemmas at a CEFR level.
+
+        Args:
+            level (str): The CEFR level, e.g. "A2"
+            pos (str): Optional part of speech to restrict to
+            limit (int): Maximum number of lemmas to return
+            exclude (iterable): Lemmas to skip, e.g. words already in the learner's deck
+
+        Returns:
+            list: LexiconEntry objects in frequency order
+        """
+        code = _level_code(level)
+        if code not in self._by_level:
+            # One pass over the table per level, then the frequency order is reused
+            indices = [i for i in range(self.count) if self._raw(i)[4] == code and self._raw(i)[1] == i]
+            indices.sort(key=lambda i: self._raw(i)[2])
+            self._by_level[code] = indices
+        exclude = {normalize_word(word) for word in exclude}
+        results = []
+        for i in self._by_level[code]:
+            entry = self._entry(i)
+            if (pos is None or entry.pos == pos) and entry.lemma not in exclude:
+                results.append(entry)
+                if len(results) >= limit:
+                    break
+        return results
+
+class LexiconSet:
+    """
+    Lazily opened lexicons for each language, stored as <directory>/<language>.lex.
+
+    A language without an index file gets None, so callers can skip local
+    level checks until its word list has been built.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lexicons = {}
+        self.lock = threading.Lock()
+
+    def path_for(self, language):
+        return os.path.join(self.directory, f"{language.lower()}.lex")
+
+    def get(self, language):
+        """
+        Get the lexicon for a language.
+
+        Args:
+            language (str): The language name as shown in the app, e.g. "French"
+
+        Returns:
+            Lexicon: The opened lexicon, or None if it hasn't been built
+        """
+        if not language:
+            return None
+        with self.lock:
+            if language not in self.lexicons:
+                path = self.path_for(language)
+                lexicon = None
+                if os.path.exists(path):
+                    try:
+                        lexicon = Lexicon(path, language)
+                    except Exception as e:
+                        logger.error(f"Error opening lexicon {path}: {str(e)}")
+                self.lexicons[language] = lexicon
+            return self.lexicons[language]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from sub.logging_setup import configure_logging
+
+    parser = argparse.ArgumentParser(description="Build and query CEFR lexicon indexes")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="Build a .lex index from a .tsv word list")
+    build_parser.add_argument("word_list")
+    build_parser.add_argument("path")
+
+    lookup_parser = commands.add_parser("lookup", help="Look up words")
+    lookup_parser.add_argument("path")
+    lookup_parser.add_argument("language")
+    lookup_parser.add_argument("words", nargs="+")
+
+    profile_parser = commands.add_parser("profile", help="Profile the levels of a piece of text")
+    profile_parser.add_argument("path")
+    profile_parser.add_argument("language")
+    profile_parser.add_argument("text")
+    profile_parser.add_argument("--target-level")
+    args = parser.parse_args()
+    configure_logging(json_format=False)
+
+    if args.command == "build":
+        count = build_lexicon(read_word_list(args.word_list), args.path)
+        print(f"Built {args.path} with {count} lemmas")
+    elif args.command == "lookup":
+        lexicon = Lexicon(args.path, args.language)
+        for word in args.words:
+            print(f"{word}: {lexicon.lookup(word)}")
+    else:
+        lexicon = Lexicon(args.path, args.language)
+        started = time.perf_counter()
+        profile = lexicon.level_profile(args.text, target_level=args.target_level)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(profile)
+        print(f"Profiled {profile['words']} words in {elapsed_ms:.2f} ms")
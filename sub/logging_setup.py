@@ -0,0 +1,173 @@
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+ROOT_LOGGER = "language_app"
+
+# Library-safe default: nothing is emitted until the application calls configure_logging()
+logging.getLogger(ROOT_LOGGER).addHandler(logging.NullHandler())
+
+_log_payloads = False
+_listener = None
+_configure_lock = threading.Lock()
+
+def get_logger(category):
+    """
+    Get the logger for one category of the app's logs, e.g. "memory" or "agent".
+
+    Args:
+        category (str): The category name, used for sampling and rate limits
+
+    Returns:
+        logging.Logger: A child of the "language_app" logger
+    """
+    return logging.getLogger(f"{ROOT_LOGGER}.{category}")
+
+def redact(text):
+    """
+    Hide learner content in logs unless payload logging is explicitly enabled.
+
+    Args:
+        text (str): Memory text, prompts or other user-provided content
+
+    Returns:
+        str: The text itself when LOG_PAYLOADS is on, otherwise a length marker
+    """
+    if text is None:
+        return None
+    if _log_payloads:
+        return text
+    return f"<redacted {len(text)} chars>"
+
+#######################################
+# Filters and Formatting
+#######################################
+class CategoryFilter(logging.Filter):
+    """
+    Sample and rate-limit log records per category.
+
+    Records below WARNING are kept with the category's sample rate. Every
+    record then needs a token from the category's per-second budget; records
+    over budget are dropped and counted, and the count is attached to the next
+    record that gets through as "suppressed".
+    """
+
+    def __init__(self, sample_rates=None, rate_limits=None, default_rate_limit=50):
+        super().__init__()
+        self.sample_rates = sample_rates or {}
+        self.rate_limits = rate_limits or {}
+        self.default_rate_limit = default_rate_limit
+        self.budgets = {}
+        self.suppressed = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        category = record.name.split(".", 1)[1] if "." in record.name else record.name
+        record.category = category
+
+        if record.levelno < logging.WARNING:
+            rate = self.sample_rates.get(category, 1.0)
+            if rate < 1.0 and random.random() >= rate:
+                return False
+
+        limit = self.rate_limits.get(category, self.default_rate_limit)
+        if not limit:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            tokens, updated = self.budgets.get(category, (limit, now))
+            tokens = min(limit, tokens + (now - updated) * limit)
+            if tokens < 1:
+                self.budgets[category] = (tokens, now)
+                self.suppressed[category] = self.suppressed.get(category, 0) + 1
+                return False
+            self.budgets[category] = (tokens - 1, now)
+            record.suppressed = self.suppressed.pop(category, 0)
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "category": getattr(record, "category", record.name),
+            "message": record.getMessage(),
+        }
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+class _AppQueueHandler(QueueHandler):
+    """
+    Queue records with their arguments merged but otherwise unformatted.
+
+    The stock prepare() runs the full formatter on the caller's thread and
+    drops exc_info. The queue is in-process, so the record can keep its
+    exc_info and be formatted by the listener thread instead.
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(record.__dict__)
+        # Merge arguments now, so later changes to them don't alter the message
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+#######################################
+# Configuration
+#######################################
+def configure_logging(level="INFO", sample_rates=None, rate_limits=None, log_payloads=False,
+                      stream=None, json_format=True):
+    """
+    Route the app's logs through a queue to a background writer thread.
+
+    Sampling and rate limiting run first on the request path, so dropped
+    records are never formatted or queued. Records that pass only have their
+    message arguments merged before going on an in-memory queue; formatting
+    and I/O happen on the listener thread. Only the
+    "language_app" logger is touched, never the root logger. Calling this
+    again is a no-op.
+
+    Args:
+        level (str): Minimum level for the app's loggers
+        sample_rates (dict): Fraction of sub-WARNING records to keep per category
+        rate_limits (dict): Maximum records per second per category (0 = unlimited)
+        log_payloads (bool): Whether redact() should pass learner content through
+        stream: Where to write logs (defaults to stderr)
+        json_format (bool): Whether to write JSON lines instead of plain text
+
+    Returns:
+        None
+    """
+    global _listener, _log_payloads
+    with _configure_lock:
+        if _listener is not None:
+            return
+        _log_payloads = log_payloads
+
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+        ))
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = _AppQueueHandler(log_queue)
+        queue_handler.addFilter(CategoryFilter(sample_rates, rate_limits))
+        app_logger = logging.getLogger(ROOT_LOGGER)
+        app_logger.setLevel(level)
+        app_logger.addHandler(queue_handler)
+        app_logger.propagate = False
+
+        _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
@@ -0,0 +1,108 @@
+import re
+import numpy as np
+from sub.quantization import normalize
+from sub.logging_setup import get_logger
+
+logger = get_logger("memory")
+
+# Memories are stored as "[YYYY-MM-DD HH:MM:SS UTC] text"
+_TIMESTAMP_PATTERN = re.compile(r"^\[[^\]]*\]\s*")
+
+def estimate_tokens(text):
+    """
+    Estimate how many model tokens a piece of text uses.
+
+    Uses the common four-characters-per-token rule of thumb, which is close
+    enough for budgeting without loading a tokenizer on every turn.
+
+    Args:
+        text (str): The text to measure
+
+    Returns:
+        int: Estimated token count
+    """
+    return max(1, (len(text) + 3) // 4)
+
+def memory_text(payload):
+    """Strip the timestamp prefix from a stored memory."""
+    return _TIMESTAMP_PATTERN.sub("", payload)
+
+def select_memories(candidates, token_budget, diversity=0.3, max_similarity=0.95, max_items=None):
+    """
+    Choose the memories to put in the prompt with maximal marginal relevance.
+
+    Memories are picked greedily by relevance minus diversity times their
+    highest cosine similarity to an already picked memory, so near-duplicates
+    stop winning once one copy is in. Memories more similar than max_similarity
+    to a picked one are dropped outright, and selection stops once the best
+    remaining score is no longer positive, so leftover budget isn't filled
+    with redundant memories. A memory that doesn't fit the remaining budget
+    is skipped in favour of the next best that does. Exact duplicates
+    (ignoring the timestamp) are collapsed to the newest copy first.
+
+    Args:
+        candidates (list): Dicts with "payload", "score" and optionally "values",
+                           e.g. from load_memory_matches(); repeated ids keep their best score
+        token_budget (int): Approximate token budget for the selected memories
+        diversity (float): Weight of redundancy against relevance; 0 ranks by relevance
+                           alone, 0.5 weighs them equally and 1 ignores relevance
+        max_similarity (float): Cosine similarity above which a memory counts as a duplicate
+        max_items (int): Optional cap on the number of memories
+
+    Returns:
+        list: Selected memory payloads in chronological order
+    """
+    # Collapse repeated ids from several queries, then identical text
+    by_id = {}
+    for candidate in candidates:
+        key = candidate.get("id") or candidate["payload"]
+        if key not in by_id or candidate["score"] > by_id[key]["score"]:
+            by_id[key] = candidate
+    by_text = {}
+    for candidate in sorted(by_id.values(), key=lambda c: c["payload"], reverse=True):
+        text = memory_text(candidate["payload"]).strip().lower()
+        if text not in by_text:
+            by_text[text] = dict(candidate)
+        else:
+            by_text[text]["score"] = max(by_text[text]["score"], candidate["score"])
+    pool = list(by_text.values())
+    if not pool or token_budget <= 0:
+        return []
+
+    relevance = np.array([c["score"] for c in pool], dtype=np.float32)
+    # Each memory costs its text plus the "- " bullet and newline
+    costs = np.array([estimate_tokens(c["payload"]) + 1 for c in pool])
+
+    # Pairwise similarities in one matrix product; memories without a
+    # comparable vector are only ranked by relevance
+    dimensions = {len(c["values"]) for c in pool if c.get("values") is not None}
+    similarity = np.zeros((len(pool), len(pool)), dtype=np.float32)
+    if len(dimensions) == 1:
+        dimension = dimensions.pop()
+        has_vector = np.array([c.get("values") is not None for c in pool])
+        vectors = np.zeros((len(pool), dimension), dtype=np.float32)
+        vectors[has_vector] = normalize(np.stack([c["values"] for c in pool if c.get("values") is not None]))
+        similarity = vectors @ vectors.T
+
+    available = np.ones(len(pool), dtype=bool)
+    redundancy = np.zeros(len(pool), dtype=np.float32)
+    remaining = token_budget
+    selected = []
+    while available.any() and (max_items is None or len(selected) < max_items):
+        available &= (costs <= remaining) & (redundancy <= max_similarity)
+        if not available.any():
+            break
+        marginal = np.where(available, (1 - diversity) * relevance - diversity * redundancy, -np.inf)
+        choice = int(np.argmax(marginal))
+        if marginal[choice] <= 0:
+            break
+        selected.append(choice)
+        available[choice] = False
+        remaining -= costs[choice]
+        redundancy = np.maximum(redundancy, similarity[:, choice])
+
+    logger.debug(
+        "Selected %d of %d memories using %d of %d tokens",
+        len(selected), len(candidates), token_budget - remaining, token_budget
+    )
+    return sorted(pool[i]["payload"] for i in selected)
@@ -0,0 +1,290 @@
+import os
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from sub.logging_setup import configure_logging, get_logger
+from sub.resilience import is_transient_error
+
+logger = get_logger("migration")
+
+# Pinecone returns at most 100 ids per list page and accepts ~100 vectors per upsert request
+LIST_PAGE_SIZE = 100
+UPSERT_BATCH_SIZE = 100
+# Retries for a transiently failed embedding or upsert request (429s, 5xx, an open circuit) before the run stops
+MAX_RETRIES = 6
+RETRY_BASE_DELAY = 2.0
+
+class RateLimiter:
+    """
+    Token bucket that spaces out requests to stay under a per-minute limit.
+
+    Shared by the worker threads so the combined request rate never exceeds
+    requests_per_minute, while still allowing a short burst at start-up.
+    """
+
+    def __init__(self, requests_per_minute, burst=None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst or max(1, requests_per_minute // 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+#######################################
+# Checkpoint Functions
+#######################################
+def load_checkpoint(path):
+    """
+    Load migration progress from disk.
+
+    Args:
+        path (str): Path to the checkpoint JSON file
+
+    Returns:
+        dict: The saved checkpoint, or None if the migration has not started
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def save_checkpoint(path, checkpoint):
+    """
+    Atomically write migration progress to disk.
+
+    The file is written next to the target and renamed into place so a crash
+    mid-write never leaves a truncated checkpoint behind.
+
+    Args:
+        path (str): Path to the checkpoint JSON file
+        checkpoint (dict): The progress to record
+
+    Returns:
+        None
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+#######################################
+# Migration Job
+#######################################
+def _list_page(source_index, namespace, pagination_token):
+    """Return the ids on one list page and the token for the next page."""
+    response = source_index.list_paginated(
+        namespace=namespace, limit=LIST_PAGE_SIZE, pagination_token=pagination_token
+    )
+    ids = [v.id for v in response.vectors]
+    next_token = response.pagination.next if response.pagination else None
+    return ids, next_token
+
+def _with_retries(description, fn, *args, limiter=None, **kwargs):
+    """
+    Call fn, retrying transient failures with exponential backoff.
+
+    Args:
+        description (str): What the call does, for the log
+        fn (callable): The request to make
+        *args: Positional arguments for fn
+        limiter (RateLimiter): Optional rate limiter to pass before every attempt
+        **kwargs: Keyword arguments for fn
+
+    Returns:
+        object: Whatever fn returns
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        if limiter:
+            limiter.acquire()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == MAX_RETRIES or not is_transient_error(e):
+                raise
+            # Exponential backoff with jitter so the workers don't retry in lockstep
+            delay = RETRY_BASE_DELAY * 2 ** attempt * random.uniform(0.5, 1.0)
+            logger.warning(f"{description} failed ({str(e)}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def _reembed_batch(records, embed_batch, limiter, model, dimension):
+    """Re-embed one batch of fetched vectors, keeping ids and metadata, retrying with backoff."""
+    texts = [record["metadata"]["payload"] for record in records]
+    vectors = _with_retries("Embedding batch", embed_batch, texts, limiter=limiter, model=model, dimension=dimension)
+    return [
+        {"id": record["id"], "values": vector, "metadata": record["metadata"]}
+        for record, vector in zip(records, vectors)
+    ]
+
+def migrate_embeddings(source_index, source_namespace, target_index, target_namespace,
+                       embed_batch, model, dimension, checkpoint_path,
+                       batch_size=500, concurrency=4, requests_per_minute=300,
+                       progress=None):
+    """
+    Re-embed every memory in a namespace into a new index or namespace.
+
+    Memories are streamed out page by page, re-embedded in large batches on a
+    thread pool behind a shared rate limiter, and upserted into the target.
+    Progress is checkpointed after every window of pages, so a restart resumes
+    from the last completed window. Upserts reuse the original ids, so pages
+    replayed after a crash simply overwrite what they wrote before.
+
+    Args:
+        source_index: Pinecone index handle to read from
+        source_namespace (str): Namespace to read from
+        target_index: Pinecone index handle to write to
+        target_namespace (str): Namespace to write to
+        embed_batch (callable): Function embedding a list of texts, like tools.get_embeddings_batch
+        model (str): The embedding model to migrate to
+        dimension (int): The output dimension of the new model
+        checkpoint_path (str): Path of the JSON checkpoint file
+        batch_size (int): Number of texts per embedding request
+        concurrency (int): Number of embedding requests in flight
+        requests_per_minute (int): Embedding request rate limit
+        progress (callable): Optional callback receiving a progress dict after each window
+
+    Returns:
+        dict: The final checkpoint
+    """
+    checkpoint = load_checkpoint(checkpoint_path) or {
+        "source_namespace": source_namespace,
+        "target_namespace": target_namespace,
+        "model": model,
+        "dimension": dimension,
+        "pagination_token": None,
+        "migrated": 0,
+        "done": False,
+        "started_at": datetime.now(tz=timezone.utc).isoformat(),
+    }
+    if checkpoint["done"]:
+        logger.info("Embedding migration already complete")
+        return checkpoint
+    if (checkpoint["source_namespace"], checkpoint["target_namespace"], checkpoint["model"],
+            checkpoint["dimension"]) != (source_namespace, target_namespace, model, dimension):
+        raise ValueError(f"Checkpoint {checkpoint_path} belongs to a different migration")
+
+    stats = source_index.describe_index_stats()
+    namespace_stats = stats.namespaces.get(source_namespace)
+    total = namespace_stats.vector_count if namespace_stats else 0
+    logger.info(f"Migrating {total} memories from '{source_namespace}' to '{target_namespace}' "
+                f"(resuming at {checkpoint['migrated']})")
+
+    limiter = RateLimiter(requests_per_minute)
+    window_size = batch_size * concurrency
+    started = time.monotonic()
+    migrated_this_run = 0
+    token = checkpoint["pagination_token"]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            # Step 1: Stream enough ids out of the source to keep every worker busy
+            ids = []
+            while len(ids) < window_size:
+                page_ids, token = _list_page(source_index, source_namespace, token)
+                ids.extend(page_ids)
+                if not token:
+                    break
+
+            # Step 2: Fetch the stored payloads for those ids
+            records = []
+            for start in range(0, len(ids), LIST_PAGE_SIZE):
+                fetched = source_index.fetch(ids=ids[start:start + LIST_PAGE_SIZE], namespace=source_namespace)
+                records.extend(
+                    {"id": v.id, "metadata": v.metadata}
+                    for v in fetched.vectors.values()
+                    if v.metadata and v.metadata.get("payload")
+                )
+
+            # Step 3: Re-embed in concurrent batches and write to the target
+            batches = [records[i:i + batch_size] for i in range(0, len(records), batch_size)]
+            for vectors in pool.map(lambda b: _reembed_batch(b, embed_batch, limiter, model, dimension), batches):
+                for start in range(0, len(vectors), UPSERT_BATCH_SIZE):
+                    _with_retries("Upsert", target_index.upsert,
+                                  vectors=vectors[start:start + UPSERT_BATCH_SIZE], namespace=target_namespace)
+
+            # Step 4: Record progress only once the whole window is durable in the target
+            migrated_this_run += len(records)
+            checkpoint["migrated"] += len(records)
+            checkpoint["pagination_token"] = token
+            checkpoint["done"] = not token
+            save_checkpoint(checkpoint_path, checkpoint)
+
+            elapsed = time.monotonic() - started
+            rate = migrated_this_run / elapsed if elapsed else 0.0
+            remaining = max(total - checkpoint["migrated"], 0)
+            report = {
+                "migrated": checkpoint["migrated"],
+                "total": total,
+                "vectors_per_second": rate,
+                "eta_seconds": remaining / rate if rate else None,
+            }
+            logger.info(f"Migrated {report['migrated']}/{total} memories "
+                        f"({rate:.1f}/s, ETA {_format_eta(report['eta_seconds'])})")
+            if progress:
+                progress(report)
+
+            if checkpoint["done"]:
+                break
+
+    logger.info(f"Embedding migration complete: {checkpoint['migrated']} memories re-embedded")
+    return checkpoint
+
+def _format_eta(seconds):
+    """Format an ETA in seconds as H:MM:SS."""
+    if seconds is None:
+        return "unknown"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+if __name__ == "__main__":
+    import argparse
+    import streamlit as st
+    from sub import tools
+
+    parser = argparse.ArgumentParser(
+        description="Re-embed all memories into the MIGRATION_* target configured in secrets.toml"
+    )
+    parser.add_argument("--checkpoint", default=tools.MIGRATION_CHECKPOINT)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests-per-minute", type=int, default=300)
+    args = parser.parse_args()
+    configure_logging(json_format=False)
+
+    target = tools.get_migration_target()
+    if tools.pc is None or target is None:
+        raise SystemExit("A Pinecone connection and MIGRATION_NAMESPACE are required to migrate embeddings")
+
+    migrate_embeddings(
+        source_index=tools.index,
+        source_namespace=st.secrets.get("PINECONE_NAMESPACE", "default"),
+        target_index=target["index"],
+        target_namespace=target["namespace"],
+        embed_batch=tools.get_embeddings_batch,
+        model=target["model"],
+        dimension=target["dimension"],
+        checkpoint_path=args.checkpoint,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        requests_per_minute=args.requests_per_minute,
+        progress=lambda r: print(f"{r['migrated']}/{r['total']} memories, "
+                                 f"{r['vectors_per_second']:.1f}/s, ETA {_format_eta(r['eta_seconds'])}"),
+    )
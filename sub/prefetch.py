@@ -0,0 +1,118 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sub.tools import save_memory, srs, lexicons
+from sub.prompts import (
+    get_system_prompt,
+    get_conversation_mode_prompt,
+    get_grammar_mode_prompt,
+    get_vocabulary_mode_prompt
+)
+from sub.logging_setup import get_logger
+
+logger = get_logger("prefetch")
+
+MODE_PROMPT_FUNCS = {
+    "conversation": get_conversation_mode_prompt,
+    "grammar": get_grammar_mode_prompt,
+    "vocabulary": get_vocabulary_mode_prompt,
+}
+
+class LessonPrefetcher:
+    """
+    Prepare a lesson's prompt state in the background as soon as it is started.
+
+    Starting a lesson records the session-start memory, then builds the base
+    system prompt (which warms the embedding and retrieval caches in tools.py)
+    and every mode-specific prompt. The UI picks the result up when the user
+    chooses a mode, so the first chat turn only pays for the completion call
+    and the retrieval specific to the user's message.
+
+    A prepared lesson that is never picked up (the tab was closed before a
+    mode was chosen) expires after `ttl` seconds, and at most `max_jobs`
+    lessons are held at once, the oldest being dropped first.
+    """
+
+    def __init__(self, max_workers=4, ttl=900, max_jobs=1000):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def _vocabulary_words(self, user_id, language, cefr_level):
+        # Vocabulary mode drills the words due in the learner's review deck
+        due_words = [card.word for card in srs.due_cards(user_id, language, limit=10)]
+        # and draws new words from the level's lexicon instead of leaving the choice to the model
+        new_words = []
+        lexicon = lexicons.get(language)
+        if lexicon:
+            new_words = [
+                entry.lemma for entry in
+                lexicon.words_at_level(cefr_level, limit=15, exclude=srs.words(user_id, language))
+            ]
+        return {"due_words": due_words, "new_words": new_words}
+
+    def _prepare(self, user_id, language, level, start_memory):
+        if start_memory:
+            save_memory(start_memory, user_id=user_id)
+        cefr_level = level.split()[0]
+        base_prompt = get_system_prompt("", user_id=user_id)
+        mode_options = {"vocabulary": self._vocabulary_words(user_id, language, cefr_level)}
+        modes = {
+            mode: prompt_func(language, cefr_level, base_prompt, **mode_options.get(mode, {}))
+            for mode, prompt_func in MODE_PROMPT_FUNCS.items()
+        }
+        return {"base": base_prompt, "modes": modes}
+
+    def _evict(self, now):
+        # Caller holds self.lock. Jobs are kept in start order, so the oldest come first.
+        while self.jobs:
+            user_id, job = next(iter(self.jobs.items()))
+            if now - job[3] < self.ttl and len(self.jobs) < self.max_jobs:
+                break
+            del self.jobs[user_id]
+
+    def start(self, user_id, language, level, start_memory=None):
+        """
+        Begin preparing a lesson in the background.
+
+        Args:
+            user_id (str): The user's unique identifier
+            language (str): The language being learned
+            level (str): The selected level label, e.g. "A1 (Beginner)"
+            start_memory (str): Optional memory to save before warming retrieval
+
+        Returns:
+            None
+        """
+        now = time.monotonic()
+        with self.lock:
+            # Re-insert so a restarted lesson moves to the back of the eviction order
+            self.jobs.pop(user_id, None)
+            self._evict(now)
+            self.jobs[user_id] = (language, level, self.pool.submit(
+                self._prepare, user_id, language, level, start_memory
+            ), now)
+
+    def get(self, user_id, language, level, timeout=30):
+        """
+        Get the prepared prompts for a lesson, waiting for the prefetch if it is still running.
+
+        Args:
+            user_id (str): The user's unique identifier
+            language (str): The language being learned
+            level (str): The selected level label
+            timeout (float): Seconds to wait for a running prefetch
+
+        Returns:
+            dict: {"base": str, "modes": {mode: str}}, computed inline if no matching prefetch exists
+        """
+        with self.lock:
+            job = self.jobs.pop(user_id, None)
+        if job and job[:2] == (language, level) and time.monotonic() - job[3] < self.ttl:
+            try:
+                return job[2].result(timeout=timeout)
+            except Exception as e:
+                logger.warning(f"Lesson prefetch failed, preparing inline: {str(e)}")
+        return self._prepare(user_id, language, level, None)
@@ -1,7 +1,8 @@
-from sub.tools import load_memories
-import logging
+from sub.tools import load_memory_matches, MEMORY_TOKEN_BUDGET
+from sub.memory_selection import select_memories
+from sub.logging_setup import get_logger
 
-logger = logging.getLogger("language_app")
+logger = get_logger("prompts")
 
 def get_system_prompt(user_prompt, user_id="1234"):
     """
@@ -14,22 +15,22 @@ def get_system_prompt(user_prompt, user_id="1234"):
     Returns:
         str: The formatted system prompt
     """
-    logger.info(f"Generating system prompt for user {user_id}")
+    logger.debug("Generating system prompt for user %s", user_id)
     
     # Load both recent memories and memories related to the current prompt
-    recent_memories = load_memories("recent conversation history", user_id=user_id)
-    prompt_memories = load_memories(user_prompt, user_id=user_id) if user_prompt else []
+    recent_memories = load_memory_matches("recent conversation history", user_id=user_id)
+    prompt_memories = load_memory_matches(user_prompt, user_id=user_id) if user_prompt else []
     
-    # Combine and deduplicate memories
-    all_memories = list(set(recent_memories + prompt_memories))
+    # Keep the most relevant, least redundant memories that fit the token budget
+    all_memories = select_memories(recent_memories + prompt_memories, MEMORY_TOKEN_BUDGET)
     
     # Format memories nicely for the prompt
     if all_memories:
         memory_text = "\n".join([f"- {memory}" for memory in all_memories])
-        logger.info(f"Found {len(all_memories)} memories for system prompt")
+        logger.debug("Found %d memories for system prompt", len(all_memories))
     else:
         memory_text = "No previous memories found."
-        logger.warning(f"No memories found for user {user_id}")
+        logger.debug("No memories found for user %s", user_id)
 
     return f"""
     - You are a language teacher with memory that helps users practice languages.
@@ -97,7 +98,7 @@ def get_grammar_mode_prompt(language, cefr_level, base_prompt):
     Suggest grammar topics appropriate for their level, with examples and practice sentences.
     """
 
-def get_vocabulary_mode_prompt(language, cefr_level, base_prompt):
+def get_vocabulary_mode_prompt(language, cefr_level, base_prompt, due_words=None, new_words=None):
     """
     Generate a system prompt for vocabulary building mode.
     
@@ -105,10 +106,20 @@ def get_vocabulary_mode_prompt(language, cefr_level, base_prompt):
         language (str): The language being learned
         cefr_level (str): The CEFR level of the user (A1, A2, B1, B2, C1)
         base_prompt (str): The base system prompt to enhance
+        due_words (list): Words from the user's review deck that are due for practice
+        new_words (list): Frequent words at the user's level that aren't in their deck yet
         
     Returns:
         str: The enhanced system prompt for vocabulary mode
     """
+    review_text = ""
+    if due_words:
+        review_text = f"""
+    These words from the user's review deck are due for practice; weave them into examples and exercises: {", ".join(due_words)}"""
+    if new_words:
+        review_text += f"""
+    When introducing new words, prefer these common {cefr_level} words the user hasn't studied yet: {", ".join(new_words)}"""
+    
     return f"""
     {base_prompt}
     
@@ -116,6 +127,7 @@ def get_vocabulary_mode_prompt(language, cefr_level, base_prompt):
     They have chosen VOCABULARY BUILDING mode.
     Focus on introducing new words and phrases with examples, pronunciation guidance, and usage contexts.
     Provide vocabulary appropriate for their level, organized by topics, with exercises to practice.
+    Use the save_vocabulary function to add each new word you teach (with its translation) to the user's review deck.{review_text}
     """
 
 def get_welcome_message(language):
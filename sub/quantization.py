@@ -0,0 +1,376 @@
+import os
+import time
+import numpy as np
+from sub.logging_setup import get_logger
+
+logger = get_logger("vectors")
+
+# Number of set bits for every possible byte value, used for Hamming distance
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+QUANTIZATION_MODES = ("float32", "int8", "binary")
+
+#######################################
+# Quantization Functions
+#######################################
+def normalize(vectors):
+    """
+    Scale vectors to unit length so that a dot product equals cosine similarity.
+
+    Args:
+        vectors (np.ndarray): A 1-D vector or 2-D array of vectors
+
+    Returns:
+        np.ndarray: float32 array of unit-length vectors (zero vectors stay zero)
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def quantize_int8(vectors):
+    """
+    Apply symmetric per-vector int8 scalar quantization to unit-length vectors.
+
+    Args:
+        vectors (np.ndarray): 2-D array of unit-length float vectors
+
+    Returns:
+        tuple: (codes, scales) where codes is an int8 array and
+               codes / scales approximates the original vectors
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    peaks = np.abs(vectors).max(axis=1)
+    peaks[peaks == 0] = 1.0
+    scales = (127.0 / peaks).astype(np.float32)
+    codes = np.rint(vectors * scales[:, None]).astype(np.int8)
+    return codes, scales
+
+def quantize_binary(vectors):
+    """
+    Reduce vectors to sign bits packed eight dimensions per byte.
+
+    Args:
+        vectors (np.ndarray): 2-D array of float vectors
+
+    Returns:
+        np.ndarray: uint8 array of shape (n, ceil(dimension / 8))
+    """
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+def hamming_distances(codes, query_code):
+    """
+    Count differing bits between a packed query and every packed code.
+
+    Args:
+        codes (np.ndarray): uint8 array of packed sign codes, shape (n, bytes)
+        query_code (np.ndarray): uint8 array of one packed sign code, shape (bytes,)
+
+    Returns:
+        np.ndarray: Hamming distance for each row of codes
+    """
+    return _POPCOUNT[np.bitwise_xor(codes, query_code)].sum(axis=1, dtype=np.int32)
+
+#######################################
+# Quantized Vector Store
+#######################################
+class QuantizedVectorStore:
+    """
+    Local vector store that keeps compressed codes resident in memory.
+
+    Searches run over int8 codes (4x smaller than float32) or packed sign bits
+    (32x smaller) and the best candidates are re-ranked with exact cosine
+    similarity. Full-precision vectors for the re-rank live either in memory
+    or, when full_vectors_path is set, in an append-only file on disk that is
+    memory-mapped so only the candidate rows are paged in.
+    """
+
+    def __init__(self, dimension=1536, mode="int8", rerank_factor=4, full_vectors_path=None, keep_full=True):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode: {mode}")
+        self.dimension = dimension
+        self.mode = mode
+        self.rerank_factor = rerank_factor
+        self.full_vectors_path = full_vectors_path
+        self.keep_full = keep_full or full_vectors_path is not None
+        self.ids = []
+        self.metadata = []
+        self._rows = {}
+        self._pending = []
+        self._codes = None
+        self._scales = None
+        self._full = None
+        self._full_map = None
+        self._full_rows = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, vector_id):
+        return vector_id in self._rows
+
+    def add(self, ids, vectors, metadata=None):
+        """
+        Add vectors to the store, replacing any already stored under the same id.
+
+        Args:
+            ids (list): Identifiers for the vectors; if an id repeats, its last vector wins
+            vectors (list): Float vectors of length self.dimension
+            metadata (list): Optional metadata dict for each vector
+
+        Returns:
+            int: Number of distinct ids added or replaced
+        """
+        vectors = normalize(np.atleast_2d(vectors))
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected {self.dimension} dimensions, got {vectors.shape[1]}")
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} ids for {len(vectors)} vectors")
+        metadata = list(metadata) if metadata is not None else [{} for _ in ids]
+
+        latest = {vector_id: position for position, vector_id in enumerate(ids)}
+        replaced = [position for vector_id, position in latest.items() if vector_id in self._rows]
+        added = [position for vector_id, position in latest.items() if vector_id not in self._rows]
+        if replaced:
+            self._replace([ids[p] for p in replaced], vectors[replaced], [metadata[p] for p in replaced])
+        if added:
+            for position in added:
+                self._rows[ids[position]] = len(self.ids)
+                self.ids.append(ids[position])
+                self.metadata.append(metadata[position])
+            self._pending.append(vectors[added])
+        return len(latest)
+
+    def _replace(self, ids, vectors, metadata):
+        """Overwrite the codes, full vectors and metadata of ids that are already stored."""
+        self._compact()
+        rows = np.array([self._rows[vector_id] for vector_id in ids])
+        if self.mode == "int8":
+            self._codes[rows], self._scales[rows] = quantize_int8(vectors)
+        elif self.mode == "binary":
+            self._codes[rows] = quantize_binary(vectors)
+        else:
+            self._codes[rows] = vectors
+        for row, entry in zip(rows, metadata):
+            self.metadata[row] = entry
+
+        if self.mode == "float32" or not self.keep_full:
+            return
+        if self.full_vectors_path:
+            with open(self.full_vectors_path, "r+b") as f:
+                for row, vector in zip(rows, vectors):
+                    f.seek(int(row) * self.dimension * 4)
+                    f.write(vector.astype(np.float32).tobytes())
+            self._full_map = None
+        else:
+            self._full[rows] = vectors
+
+    def _compact(self):
+        """Fold vectors added since the last search into the code arrays."""
+        if not self._pending:
+            return
+        vectors = np.concatenate(self._pending)
+        self._pending = []
+
+        if self.mode == "int8":
+            codes, scales = quantize_int8(vectors)
+            self._scales = scales if self._scales is None else np.concatenate([self._scales, scales])
+        elif self.mode == "binary":
+            codes = quantize_binary(vectors)
+        else:
+            codes = vectors
+        self._codes = codes if self._codes is None else np.concatenate([self._codes, codes])
+
+        if self.mode == "float32" or not self.keep_full:
+            return
+        if self.full_vectors_path:
+            with open(self.full_vectors_path, "ab") as f:
+                f.write(vectors.astype(np.float32).tobytes())
+            self._full_rows += len(vectors)
+            self._full_map = None
+        else:
+            self._full = vectors if self._full is None else np.concatenate([self._full, vectors])
+
+    def _full_vectors(self, rows):
+        """Return full-precision vectors for the given row numbers, or None."""
+        if self.mode == "float32":
+            return self._codes[rows]
+        if self.full_vectors_path:
+            if self._full_map is None:
+                self._full_map = np.memmap(self.full_vectors_path, dtype=np.float32, mode="r",
+                                           shape=(self._full_rows, self.dimension))
+            return np.asarray(self._full_map[rows])
+        if self._full is not None:
+            return self._full[rows]
+        return None
+
+    def get(self, vector_id):
+        """
+        Look up a stored vector by id.
+
+        Args:
+            vector_id: The identifier the vector was added with
+
+        Returns:
+            tuple: (vector, metadata), where vector is exact when full vectors are
+                   kept and otherwise reconstructed from the codes
+        """
+        self._compact()
+        row = self._rows[vector_id]
+        full = self._full_vectors(np.array([row]))
+        if full is not None:
+            vector = full[0]
+        elif self.mode == "int8":
+            vector = self._codes[row] / self._scales[row]
+        else:
+            bits = np.unpackbits(self._codes[row])[:self.dimension]
+            vector = (bits.astype(np.float32) * 2 - 1) / np.sqrt(self.dimension)
+        return vector, self.metadata[row]
+
+    def update_metadata(self, vector_id, metadata):
+        """Replace the metadata stored for a vector."""
+        self.metadata[self._rows[vector_id]] = metadata
+
+    def _approximate_scores(self, query):
+        """Score every stored vector against a unit-length query using the codes."""
+        if self.mode == "int8":
+            return (self._codes @ query) / self._scales
+        if self.mode == "binary":
+            # Map Hamming distance onto [-1, 1] so it reads like a cosine
+            distances = hamming_distances(self._codes, quantize_binary(query[None, :])[0])
+            return 1.0 - 2.0 * distances / self.dimension
+        return self._codes @ query
+
+    def search(self, vector, top_k=10, rerank=True):
+        """
+        Find the stored vectors most similar to a query vector.
+
+        Args:
+            vector (list): The query vector
+            top_k (int): Number of results to return
+            rerank (bool): Whether to re-rank candidates with exact cosine similarity
+
+        Returns:
+            list: (id, score, metadata) tuples sorted by descending score
+        """
+        self._compact()
+        if not self.ids:
+            return []
+        query = normalize(vector)
+        scores = self._approximate_scores(query)
+
+        candidate_count = min(len(scores), top_k * max(self.rerank_factor, 1) if rerank else top_k)
+        candidates = np.argpartition(-scores, candidate_count - 1)[:candidate_count]
+
+        if rerank and self.mode != "float32":
+            full = self._full_vectors(candidates)
+            if full is not None:
+                scores = np.zeros(len(self.ids), dtype=np.float32)
+                scores[candidates] = full @ query
+
+        order = candidates[np.argsort(-scores[candidates], kind="stable")][:top_k]
+        return [(self.ids[i], float(scores[i]), self.metadata[i]) for i in order]
+
+    def nbytes(self):
+        """
+        Memory held resident by the store's vector data.
+
+        Returns:
+            int: Bytes used by codes, scales and in-memory full vectors
+        """
+        self._compact()
+        total = 0
+        for array in (self._codes, self._scales, self._full):
+            if array is not None:
+                total += array.nbytes
+        return total
+
+#######################################
+# Benchmark
+#######################################
+def benchmark(vectors, queries, top_k=10, rerank_factors=(1, 4, 10)):
+    """
+    Measure recall@k and resident memory for each quantization mode.
+
+    Recall is measured against exact float32 cosine search over the same data.
+    Full vectors are kept on disk for the re-rank so the memory figures reflect
+    only what stays resident.
+
+    Args:
+        vectors (np.ndarray): 2-D array of corpus vectors
+        queries (np.ndarray): 2-D array of query vectors
+        top_k (int): The k in recall@k
+        rerank_factors (tuple): Candidate multipliers to evaluate for re-ranking
+
+    Returns:
+        list: One result dict per configuration
+    """
+    import tempfile
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    dimension = vectors.shape[1]
+    ids = list(range(len(vectors)))
+
+    exact = QuantizedVectorStore(dimension, mode="float32")
+    exact.add(ids, vectors)
+    truth = [{i for i, _, _ in exact.search(q, top_k)} for q in queries]
+    baseline_bytes = exact.nbytes()
+
+    results = [{
+        "mode": "float32", "rerank_factor": 0, f"recall@{top_k}": 1.0,
+        "bytes_per_vector": baseline_bytes / len(ids), "compression": 1.0,
+        "query_ms": None,
+    }]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("int8", "binary"):
+            for factor in (0,) + tuple(rerank_factors):
+                path = os.path.join(tmp, f"{mode}-{factor}.f32")
+                store = QuantizedVectorStore(dimension, mode=mode, rerank_factor=factor,
+                                             full_vectors_path=path if factor else None,
+                                             keep_full=bool(factor))
+                store.add(ids, vectors)
+                store.nbytes()  # Build the codes outside the timed section
+
+                hits = 0
+                start = time.perf_counter()
+                for query, expected in zip(queries, truth):
+                    found = {i for i, _, _ in store.search(query, top_k, rerank=bool(factor))}
+                    hits += len(found & expected)
+                elapsed = time.perf_counter() - start
+
+                resident = store.nbytes()
+                results.append({
+                    "mode": mode, "rerank_factor": factor,
+                    f"recall@{top_k}": hits / (len(queries) * top_k),
+                    "bytes_per_vector": resident / len(ids),
+                    "compression": baseline_bytes / resident,
+                    "query_ms": 1000 * elapsed / len(queries),
+                })
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark quantized memory search")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+
+    # Clustered synthetic data resembles text embeddings better than uniform noise
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((64, args.dimension)).astype(np.float32)
+    corpus = centers[rng.integers(0, 64, args.vectors)] + 0.5 * rng.standard_normal(
+        (args.vectors, args.dimension)).astype(np.float32)
+    probes = corpus[rng.integers(0, args.vectors, args.queries)] + 0.3 * rng.standard_normal(
+        (args.queries, args.dimension)).astype(np.float32)
+
+    for row in benchmark(corpus, probes, top_k=args.top_k):
+        query_ms = "-" if row["query_ms"] is None else f"{row['query_ms']:.2f}"
+        print(f"{row['mode']:>8} rerank x{row['rerank_factor']:<3} "
+              f"recall@{args.top_k}={row[f'recall@{args.top_k}']:.3f} "
+              f"bytes/vec={row['bytes_per_vector']:.0f} "
+              f"compression={row['compression']:.1f}x query_ms={query_ms}")
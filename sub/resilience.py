@@ -0,0 +1,406 @@
+import time
+import random
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from sub.logging_setup import get_logger
+
+logger = get_logger("resilience")
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open."""
+
+# Error responses worth retrying: timeouts, conflicts, early data and rate limits, plus any 5xx
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 425, 429})
+
+def _transport_error_types():
+    """Client-library errors raised when no response arrived, for the libraries that are installed."""
+    types = [TimeoutError, ConnectionError, CircuitOpenError]
+    try:
+        import openai
+        types.append(openai.APIConnectionError)  # Includes APITimeoutError
+    except ImportError:
+        pass
+    try:
+        import urllib3
+        types.append(urllib3.exceptions.HTTPError)  # Pinecone's transport
+    except ImportError:
+        pass
+    return tuple(types)
+
+_TRANSPORT_ERRORS = _transport_error_types()
+
+def is_transient_error(error):
+    """
+    Decide whether a failed call could succeed if it were simply retried.
+
+    Timeouts, connection failures, rate limits and server errors are
+    transient. Other error responses, such as a 400 for an over-long input,
+    fail the same way every time, so they shouldn't open a breaker shared by
+    every user or be replayed from the outbox.
+
+    Args:
+        error (Exception): The exception the call raised
+
+    Returns:
+        bool: Whether the error is transient
+    """
+    if isinstance(error, _TRANSPORT_ERRORS):
+        return True
+    # OpenAI errors carry status_code, Pinecone's carry status
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(error, "status", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    return False
+
+#######################################
+# Circuit Breaker
+#######################################
+class CircuitBreaker:
+    """
+    Fail fast when a dependency keeps failing.
+
+    After failure_threshold consecutive failures the breaker opens and every
+    call raises CircuitOpenError immediately. Once reset_timeout seconds have
+    passed a single trial call is let through (half-open); success closes the
+    breaker again, failure re-opens it for another reset_timeout. Only errors
+    accepted by is_failure count as failures; any other error is re-raised
+    but treated as an answer from a healthy dependency.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, is_failure=is_transient_error):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def _before_call(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout or self.trial_in_flight:
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            self.trial_in_flight = True
+
+    def _record(self, success):
+        with self.lock:
+            self.trial_in_flight = False
+            if success:
+                if self.opened_at is not None:
+                    logger.info(f"{self.name} circuit closed")
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"{self.name} circuit opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+
+    def call(self, fn, *args, **kwargs):
+        """
+        Call fn through the breaker.
+
+        Args:
+            fn (callable): The dependency call to protect
+            *args: Positional arguments for fn
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            object: Whatever fn returns
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+        """
+        self._before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._record(not self.is_failure(e))
+            raise
+        self._record(True)
+        return result
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_breaker(name, failure_threshold=5, reset_timeout=30.0, is_failure=is_transient_error):
+    """
+    Get the process-wide circuit breaker for a dependency, creating it on first use.
+
+    Args:
+        name (str): The dependency name, e.g. "embeddings", "index" or "chat"
+        failure_threshold (int): Consecutive failures before the breaker opens
+        reset_timeout (float): Seconds to stay open before a trial call
+        is_failure (callable): Decides which exceptions count against the dependency
+
+    Returns:
+        CircuitBreaker: The shared breaker
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, failure_threshold, reset_timeout, is_failure)
+        return _breakers[name]
+
+#######################################
+# Hedged Requests
+#######################################
+_hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hedge")
+
+def configure_hedging(max_workers):
+    """
+    Resize the thread pool shared by hedged calls.
+
+    Losing attempts keep their thread until they finish, so the pool should
+    cover twice the number of calls that can be admitted at once.
+
+    Args:
+        max_workers (int): Number of pool threads
+
+    Returns:
+        None
+    """
+    global _hedge_pool
+    old_pool = _hedge_pool
+    _hedge_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+    old_pool.shutdown(wait=False)
+
+def hedged_call(fn, *args, hedge_after=1.0, admission=None, timeout=None, **kwargs):
+    """
+    Call an idempotent function, sending a backup request if the first is slow.
+
+    If the first attempt hasn't finished after hedge_after seconds a second
+    identical attempt is started, and whichever succeeds first wins. The
+    losing attempt is left to finish in the background.
+
+    Args:
+        fn (callable): The idempotent call to make
+        *args: Positional arguments for fn
+        hedge_after (float): Seconds to wait before hedging; 0 or None disables hedging
+        admission: Optional object with try_acquire() and release(), e.g. the
+                   Scheduler; the backup is only sent if it is admitted at once,
+                   so hedging never exceeds the configured rate or concurrency
+        timeout (float): Optional limit in seconds for the whole call, including
+                         time spent waiting for a pool thread
+        **kwargs: Keyword arguments for fn
+
+    Returns:
+        object: The result of the first successful attempt
+
+    Raises:
+        TimeoutError: If no attempt succeeded within timeout
+    """
+    if not hedge_after:
+        return fn(*args, **kwargs)
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    attempts = [_hedge_pool.submit(fn, *args, **kwargs)]
+    done, _ = wait(attempts, timeout=hedge_after)
+    if not done and (admission is None or admission.try_acquire()):
+        backup = _hedge_pool.submit(fn, *args, **kwargs)
+        if admission is not None:
+            backup.add_done_callback(lambda _: admission.release())
+        attempts.append(backup)
+
+    pending = set(attempts)
+    error = None
+    while pending:
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        if not done:
+            for attempt in pending:
+                attempt.cancel()
+            raise TimeoutError(f"No attempt finished within {timeout}s")
+        for attempt in done:
+            if attempt.exception() is None:
+                return attempt.result()
+            error = attempt.exception()
+    raise error
+
+#######################################
+# Durable Write Outbox
+#######################################
+class MemoryOutbox:
+    """
+    SQLite journal of memory writes that failed, replayed in the background.
+
+    Each entry keeps the memory id, so replaying a write that actually reached
+    the index before failing just overwrites the same vector. An entry whose
+    replay fails with a permanent error, or that has failed max_attempts
+    times, is moved to a dead-letter state and kept for inspection instead of
+    being retried forever.
+    """
+
+    def __init__(self, path, base_delay=5.0, max_delay=600.0, poll_interval=5.0,
+                 max_attempts=10, is_retryable=is_transient_error):
+        self.path = path
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.is_retryable = is_retryable
+        self._thread = None
+        self._stop = threading.Event()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    memory_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt REAL NOT NULL,
+                    last_error TEXT,
+                    dead INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            # Journals created before dead-lettering lack the column
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}
+            if "dead" not in columns:
+                conn.execute("ALTER TABLE outbox ADD COLUMN dead INTEGER NOT NULL DEFAULT 0")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def enqueue(self, memory_id, user_id, payload, timestamp, error=None):
+        """
+        Journal a memory write for later replay.
+
+        Args:
+            memory_id (str): The id the memory will be stored under
+            user_id (str): The user's unique identifier
+            payload (str): The timestamped memory text
+            timestamp (str): The memory's creation time
+            error (str): Why the write failed
+
+        Returns:
+            None
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO outbox (memory_id, user_id, payload, timestamp, next_attempt, last_error) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (memory_id, user_id, payload, timestamp, time.time() + self.base_delay, error)
+            )
+        logger.warning(f"Queued memory {memory_id} for retry: {error}")
+
+    def pending(self):
+        """
+        Count journaled writes that have not been replayed yet.
+
+        Returns:
+            int: Number of pending writes
+        """
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM outbox WHERE dead = 0").fetchone()[0]
+
+    def dead_letters(self):
+        """
+        List journaled writes that were given up on.
+
+        Returns:
+            list: Dicts with the memory id, user id, payload, attempts and last error
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT memory_id, user_id, payload, attempts, last_error FROM outbox WHERE dead = 1"
+            ).fetchall()
+        return [
+            {"memory_id": memory_id, "user_id": user_id, "payload": payload, "attempts": attempts, "error": error}
+            for memory_id, user_id, payload, attempts, error in rows
+        ]
+
+    def replay_due(self, writer, limit=50):
+        """
+        Retry journaled writes whose backoff has expired.
+
+        Args:
+            writer (callable): Called as writer(memory_id, user_id, payload, timestamp)
+            limit (int): Maximum number of writes to retry in this pass
+
+        Returns:
+            int: Number of writes that succeeded
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT memory_id, user_id, payload, timestamp, attempts FROM outbox "
+                "WHERE dead = 0 AND next_attempt <= ? ORDER BY next_attempt LIMIT ?",
+                (time.time(), limit)
+            ).fetchall()
+
+        replayed = 0
+        for memory_id, user_id, payload, timestamp, attempts in rows:
+            try:
+                writer(memory_id, user_id, payload, timestamp)
+            except Exception as e:
+                if attempts + 1 >= self.max_attempts or not self.is_retryable(e):
+                    with self._connect() as conn:
+                        conn.execute(
+                            "UPDATE outbox SET attempts = attempts + 1, last_error = ?, dead = 1 WHERE memory_id = ?",
+                            (str(e), memory_id)
+                        )
+                    logger.error(f"Gave up on memory {memory_id} after {attempts + 1} attempts: {str(e)}")
+                    continue
+                # Exponential backoff with jitter so replays don't synchronise
+                delay = min(self.base_delay * 2 ** (attempts + 1), self.max_delay)
+                delay *= random.uniform(0.5, 1.0)
+                with self._connect() as conn:
+                    conn.execute(
+                        "UPDATE outbox SET attempts = attempts + 1, next_attempt = ?, last_error = ? "
+                        "WHERE memory_id = ?",
+                        (time.time() + delay, str(e), memory_id)
+                    )
+                if isinstance(e, CircuitOpenError):
+                    break
+                continue
+            with self._connect() as conn:
+                conn.execute("DELETE FROM outbox WHERE memory_id = ?", (memory_id,))
+            replayed += 1
+
+        if replayed:
+            logger.info(f"Replayed {replayed} queued memory writes")
+        return replayed
+
+    def start(self, writer):
+        """
+        Start the background replay thread (once per process).
+
+        Args:
+            writer (callable): Called as writer(memory_id, user_id, payload, timestamp)
+
+        Returns:
+            None
+        """
+        if self._thread and self._thread.is_alive():
+            return
+
+        def run():
+            while not self._stop.wait(self.poll_interval):
+                try:
+                    self.replay_due(writer)
+                except Exception as e:
+                    logger.error(f"Error replaying memory outbox: {str(e)}")
+
+        self._thread = threading.Thread(target=run, name="memory-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background replay thread."""
+        self._stop.set()
@@ -0,0 +1,300 @@
+import time
+import threading
+import itertools
+import contextvars
+from contextlib import contextmanager
+from sub.logging_setup import get_logger
+
+logger = get_logger("scheduler")
+
+# Who the current outbound call is for, set by callers with scheduling()
+_current_user = contextvars.ContextVar("scheduler_user", default=None)
+_current_priority = contextvars.ContextVar("scheduler_priority", default="interactive")
+
+class SchedulerOverloaded(Exception):
+    """Raised when a call is shed instead of queued because the scheduler is saturated."""
+
+@contextmanager
+def scheduling(user_id=None, priority="interactive"):
+    """
+    Attribute outbound calls made inside the block to a user and priority class.
+
+    Args:
+        user_id (str): The user the calls are made for
+        priority (str): "interactive" for calls on the user's turn, "background" for deferred work
+    """
+    user_token = _current_user.set(user_id)
+    priority_token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_user.reset(user_token)
+        _current_priority.reset(priority_token)
+
+#######################################
+# Token Bucket
+#######################################
+class TokenBucket:
+    """Allow rate requests per second on average with bursts of up to capacity."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        # now can predate the bucket when it was read before the bucket was created
+        if now <= self.updated:
+            return
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, cost, now):
+        self._refill(now)
+        return self.tokens >= cost
+
+    def take(self, cost):
+        self.tokens -= cost
+
+    def time_until(self, cost, now):
+        """Seconds until cost tokens will be available."""
+        self._refill(now)
+        return max(0.0, (cost - self.tokens) / self.rate)
+
+#######################################
+# Scheduler
+#######################################
+class _Ticket:
+    __slots__ = ("user_id", "priority", "cost", "tag", "seq", "enqueued")
+
+    def __init__(self, user_id, priority, cost, tag, seq):
+        self.user_id = user_id
+        self.priority = priority
+        self.cost = cost
+        self.tag = tag
+        self.seq = seq
+        self.enqueued = time.monotonic()
+
+class Scheduler:
+    """
+    Process-wide admission control for outbound model and index calls.
+
+    Each call waits for a concurrency slot, a token from the global bucket and
+    a token from its user's bucket. Waiting calls are admitted in weighted
+    fair queuing order: each priority class gets a virtual finish tag that
+    advances by cost / weight per call, so with the default weights
+    interactive calls get four slots for every background one while
+    background work still can't be starved. Calls are shed with
+    SchedulerOverloaded when their class's queue is full or they have waited
+    longer than the class allows, so overload turns into fast degradation
+    instead of a pile-up of timeouts and 429s.
+    """
+
+    def __init__(self, max_concurrency=8, global_rate=20.0, global_burst=40,
+                 user_rate=1.0, user_burst=5, weights=None, max_queue=None, max_wait=None):
+        self.max_concurrency = max_concurrency
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.weights = weights or {"interactive": 4.0, "background": 1.0}
+        self.max_queue = max_queue or {"interactive": 200, "background": 50}
+        self.max_wait = max_wait or {"interactive": 15.0, "background": 60.0}
+        self.user_buckets = {}
+        self.in_flight = 0
+        self.waiting = []
+        self.virtual_time = 0.0
+        self.last_finish = {name: 0.0 for name in self.weights}
+        self.stats = {name: {"admitted": 0, "shed": 0, "waits": []} for name in self.weights}
+        self._seq = itertools.count()
+        self.cond = threading.Condition()
+        self._metrics_thread = None
+
+    def _user_bucket(self, user_id):
+        if user_id not in self.user_buckets:
+            # Drop buckets of idle users that have refilled completely
+            if len(self.user_buckets) > 10000:
+                now = time.monotonic()
+                self.user_buckets = {
+                    uid: bucket for uid, bucket in self.user_buckets.items()
+                    if not bucket.available(bucket.capacity, now)
+                }
+            self.user_buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+        return self.user_buckets[user_id]
+
+    def _next_ticket(self, now):
+        """Return the waiting ticket to admit now, or None, plus how long to wait otherwise."""
+        if self.in_flight >= self.max_concurrency:
+            return None, None
+        retry = None
+        best = None
+        for ticket in self.waiting:
+            bucket = self._user_bucket(ticket.user_id)
+            if not bucket.available(ticket.cost, now):
+                delay = bucket.time_until(ticket.cost, now)
+                retry = delay if retry is None else min(retry, delay)
+                continue
+            if best is None or (ticket.tag, ticket.seq) < (best.tag, best.seq):
+                best = ticket
+        if best is not None and not self.global_bucket.available(best.cost, now):
+            return None, self.global_bucket.time_until(best.cost, now)
+        return best, retry
+
+    def _acquire(self, user_id, priority, cost):
+        if priority not in self.weights:
+            raise ValueError(f"Unknown priority class: {priority}")
+        with self.cond:
+            queued = sum(1 for t in self.waiting if t.priority == priority)
+            if queued >= self.max_queue[priority]:
+                self.stats[priority]["shed"] += 1
+                raise SchedulerOverloaded(f"{priority} queue is full ({queued} waiting)")
+
+            tag = max(self.virtual_time, self.last_finish[priority]) + cost / self.weights[priority]
+            self.last_finish[priority] = tag
+            ticket = _Ticket(user_id, priority, cost, tag, next(self._seq))
+            self.waiting.append(ticket)
+            deadline = ticket.enqueued + self.max_wait[priority]
+
+            while True:
+                now = time.monotonic()
+                chosen, retry = self._next_ticket(now)
+                if chosen is ticket:
+                    break
+                if chosen is not None:
+                    # Someone else is due first; make sure they get woken up
+                    self.cond.notify_all()
+                if now >= deadline:
+                    self.waiting.remove(ticket)
+                    self.stats[priority]["shed"] += 1
+                    self.cond.notify_all()
+                    raise SchedulerOverloaded(f"{priority} call waited more than {self.max_wait[priority]}s")
+                timeout = deadline - now if retry is None else min(retry, deadline - now)
+                self.cond.wait(timeout=max(timeout, 0.001))
+
+            self.waiting.remove(ticket)
+            self._user_bucket(user_id).take(cost)
+            self.global_bucket.take(cost)
+            self.in_flight += 1
+            self.virtual_time = ticket.tag
+            stats = self.stats[priority]
+            stats["admitted"] += 1
+            stats["waits"].append(now - ticket.enqueued)
+            del stats["waits"][:-1000]
+            # Another waiter may also be admissible now
+            self.cond.notify_all()
+
+    def _release(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+
+    def try_acquire(self, user_id=None, priority=None, cost=1):
+        """
+        Take an admission slot only if one is free right now, e.g. for a hedged request.
+
+        Never queues and never jumps ahead of waiting calls. A successful
+        call must be paired with release().
+
+        Args:
+            user_id (str): The user the call is for; defaults to the scheduling() context
+            priority (str): The priority class; defaults to the scheduling() context
+            cost (float): Tokens the call consumes
+
+        Returns:
+            bool: Whether the slot was taken
+        """
+        user_id = user_id if user_id is not None else _current_user.get()
+        priority = priority or _current_priority.get()
+        with self.cond:
+            now = time.monotonic()
+            bucket = self._user_bucket(user_id)
+            if (self.waiting or self.in_flight >= self.max_concurrency
+                    or not bucket.available(cost, now) or not self.global_bucket.available(cost, now)):
+                return False
+            bucket.take(cost)
+            self.global_bucket.take(cost)
+            self.in_flight += 1
+            self.stats[priority]["admitted"] += 1
+            return True
+
+    def release(self):
+        """Give back a slot taken with try_acquire()."""
+        self._release()
+
+    @contextmanager
+    def slot(self, user_id=None, priority=None, cost=1):
+        """
+        Hold an admission slot for the duration of the block.
+
+        Args:
+            user_id (str): The user the call is for; defaults to the scheduling() context
+            priority (str): The priority class; defaults to the scheduling() context
+            cost (float): Tokens the call consumes
+
+        Raises:
+            SchedulerOverloaded: If the call is shed
+        """
+        user_id = user_id if user_id is not None else _current_user.get()
+        priority = priority or _current_priority.get()
+        self._acquire(user_id, priority, cost)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Call fn once admitted, attributed to the current scheduling() context.
+
+        Args:
+            fn (callable): The outbound call to make
+            *args: Positional arguments for fn
+            **kwargs: Keyword arguments for fn
+
+        Returns:
+            object: Whatever fn returns
+        """
+        with self.slot():
+            return fn(*args, **kwargs)
+
+    def start_metrics_logging(self, interval=60.0):
+        """
+        Log metrics() every interval seconds from a background thread (once per process).
+
+        Args:
+            interval (float): Seconds between log lines; 0 disables logging
+
+        Returns:
+            None
+        """
+        if not interval or (self._metrics_thread and self._metrics_thread.is_alive()):
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                logger.info("Scheduler metrics: %s", self.metrics())
+
+        self._metrics_thread = threading.Thread(target=run, name="scheduler-metrics", daemon=True)
+        self._metrics_thread.start()
+
+    def metrics(self):
+        """
+        Snapshot queue depth, concurrency and wait times per priority class.
+
+        Returns:
+            dict: Scheduler metrics, with wait times in seconds over the last 1000 admissions
+        """
+        with self.cond:
+            result = {"in_flight": self.in_flight, "max_concurrency": self.max_concurrency, "classes": {}}
+            for name, stats in self.stats.items():
+                waits = sorted(stats["waits"])
+                result["classes"][name] = {
+                    "queue_depth": sum(1 for t in self.waiting if t.priority == name),
+                    "admitted": stats["admitted"],
+                    "shed": stats["shed"],
+                    "wait_p50": waits[len(waits) // 2] if waits else 0.0,
+                    "wait_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+                    "wait_max": waits[-1] if waits else 0.0,
+                }
+            return result
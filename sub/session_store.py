@@ -0,0 +1,310 @@
+import json
+import time
+import bisect
+import hashlib
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from sub.logging_setup import get_logger
+
+logger = get_logger("sessions")
+
+def _dumps(value):
+    """Serialize compactly; messages are appended one at a time, so every byte is repeated per turn."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+#######################################
+# Session Store Interface
+#######################################
+class SessionStore(ABC):
+    """
+    Server-side conversation state keyed by user id.
+
+    Messages are stored as an append-only list so each turn writes only the
+    new message, and the small mode/lesson state is stored separately so it
+    can be rewritten without touching the transcript. Backends implement
+    every abstract method, so an incomplete one fails when it is created.
+    """
+
+    @abstractmethod
+    def append_message(self, user_id, message):
+        """Append one message to the user's conversation."""
+
+    @abstractmethod
+    def update_message(self, user_id, position, message):
+        """Replace the message at a position, e.g. the system prompt at 0."""
+
+    @abstractmethod
+    def save_state(self, user_id, state):
+        """Replace the user's mode and lesson state."""
+
+    @abstractmethod
+    def load(self, user_id):
+        """
+        Load a user's session.
+
+        Args:
+            user_id (str): The user's unique identifier
+
+        Returns:
+            dict: {"messages": list, "state": dict}, or None if there is no saved session
+        """
+
+    @abstractmethod
+    def clear(self, user_id):
+        """Delete the user's session."""
+
+    def replace_messages(self, user_id, messages):
+        """Reset the conversation to the given messages."""
+        self.clear(user_id)
+        for message in messages:
+            self.append_message(user_id, message)
+
+#######################################
+# SQLite Backend
+#######################################
+class SQLiteSessionStore(SessionStore):
+    """Session store in a local SQLite file, shared by every worker on the node."""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS session_messages (
+                    user_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    body TEXT NOT NULL,
+                    PRIMARY KEY (user_id, position)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS session_state (
+                    user_id TEXT PRIMARY KEY,
+                    body TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def append_message(self, user_id, message):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO session_messages (user_id, position, body) "
+                "SELECT ?, COALESCE(MAX(position) + 1, 0), ? FROM session_messages WHERE user_id = ?",
+                (user_id, _dumps(message), user_id)
+            )
+
+    def update_message(self, user_id, position, message):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE session_messages SET body = ? WHERE user_id = ? AND position = ?",
+                (_dumps(message), user_id, position)
+            )
+
+    def save_state(self, user_id, state):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO session_state (user_id, body, updated_at) VALUES (?, ?, ?)",
+                (user_id, _dumps(state), time.time())
+            )
+
+    def load(self, user_id):
+        with self._connect() as conn:
+            state = conn.execute("SELECT body FROM session_state WHERE user_id = ?", (user_id,)).fetchone()
+            rows = conn.execute(
+                "SELECT body FROM session_messages WHERE user_id = ? ORDER BY position", (user_id,)
+            ).fetchall()
+        if state is None and not rows:
+            return None
+        return {
+            "messages": [json.loads(body) for (body,) in rows],
+            "state": json.loads(state[0]) if state else {},
+        }
+
+    def clear(self, user_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM session_messages WHERE user_id = ?", (user_id,))
+            conn.execute("DELETE FROM session_state WHERE user_id = ?", (user_id,))
+
+#######################################
+# Redis Backend
+#######################################
+class RedisSessionStore(SessionStore):
+    """
+    Session store on any client exposing the Redis list and string commands used here.
+
+    Works with redis.Redis(decode_responses=True) or the in-process LocalRedis
+    stand-in. Sessions expire after ttl seconds of inactivity.
+    """
+
+    def __init__(self, client, prefix="session", ttl=7 * 24 * 3600):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _keys(self, user_id):
+        return f"{self.prefix}:{user_id}:messages", f"{self.prefix}:{user_id}:state"
+
+    def _touch(self, user_id):
+        for key in self._keys(user_id):
+            self.client.expire(key, self.ttl)
+
+    def append_message(self, user_id, message):
+        self.client.rpush(self._keys(user_id)[0], _dumps(message))
+        self._touch(user_id)
+
+    def update_message(self, user_id, position, message):
+        self.client.lset(self._keys(user_id)[0], position, _dumps(message))
+
+    def save_state(self, user_id, state):
+        self.client.set(self._keys(user_id)[1], _dumps(state))
+        self._touch(user_id)
+
+    def load(self, user_id):
+        messages_key, state_key = self._keys(user_id)
+        state = self.client.get(state_key)
+        messages = self.client.lrange(messages_key, 0, -1)
+        if state is None and not messages:
+            return None
+        return {
+            "messages": [json.loads(body) for body in messages],
+            "state": json.loads(state) if state else {},
+        }
+
+    def clear(self, user_id):
+        self.client.delete(*self._keys(user_id))
+
+class LocalRedis:
+    """
+    Minimal in-process stand-in for the Redis commands RedisSessionStore uses.
+
+    Useful for development and single-node deployments without a Redis server;
+    data lives only as long as the process.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+
+    def _live(self, key):
+        if key in self.expires and self.expires[key] <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def rpush(self, key, *values):
+        with self.lock:
+            items = self._live(key)
+            if items is None:
+                items = self.data[key] = []
+            items.extend(values)
+            return len(items)
+
+    def lset(self, key, position, value):
+        with self.lock:
+            items = self._live(key)
+            if items is None:
+                raise KeyError(key)
+            items[position] = value
+
+    def lrange(self, key, start, end):
+        with self.lock:
+            items = self._live(key) or []
+            return list(items[start:None if end == -1 else end + 1])
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.expires.pop(key, None)
+
+    def get(self, key):
+        with self.lock:
+            return self._live(key)
+
+    def expire(self, key, seconds):
+        with self.lock:
+            if self._live(key) is not None:
+                self.expires[key] = time.time() + seconds
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.data.pop(key, None)
+                self.expires.pop(key, None)
+
+#######################################
+# Consistent Hash Routing
+#######################################
+class HashRing:
+    """
+    Consistent hash ring mapping user ids to nodes.
+
+    Adding or removing a node only moves the users between it and its ring
+    neighbours, so a load balancer using node_for() as a routing hint keeps
+    most users on the node that already has their session warm.
+    """
+
+    def __init__(self, nodes, replicas=100):
+        self.replicas = replicas
+        self._hashes = []
+        self._nodes = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def add(self, node):
+        for replica in range(self.replicas):
+            point = self._hash(f"{node}#{replica}")
+            bisect.insort(self._hashes, point)
+            self._nodes[point] = node
+
+    def remove(self, node):
+        for replica in range(self.replicas):
+            point = self._hash(f"{node}#{replica}")
+            self._hashes.remove(point)
+            del self._nodes[point]
+
+    def node_for(self, user_id):
+        """
+        Get the node that should serve a user.
+
+        Args:
+            user_id (str): The user's unique identifier
+
+        Returns:
+            str: The node name, or None if the ring is empty
+        """
+        if not self._hashes:
+            return None
+        position = bisect.bisect(self._hashes, self._hash(user_id)) % len(self._hashes)
+        return self._nodes[self._hashes[position]]
+
+def create_session_store(backend="sqlite", path="sessions.db", redis_url=None):
+    """
+    Create the session store selected by configuration.
+
+    Args:
+        backend (str): "sqlite", "redis" or "local_redis"
+        path (str): SQLite file path for the sqlite backend
+        redis_url (str): Connection URL for the redis backend
+
+    Returns:
+        SessionStore: The configured store
+    """
+    if backend == "sqlite":
+        return SQLiteSessionStore(path)
+    if backend == "local_redis":
+        return RedisSessionStore(LocalRedis())
+    if backend == "redis":
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("The redis session store requires the redis package: pip install redis")
+        return RedisSessionStore(redis.Redis.from_url(redis_url, decode_responses=True))
+    raise ValueError(f"Unknown session store backend: {backend}")
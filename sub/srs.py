@@ -0,0 +1,315 @@
+import time
+import heapq
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from sub.logging_setup import get_logger
+
+logger = get_logger("srs")
+
+DAY = 86400.0
+
+# Answer grades on the SM-2 0-5 scale, as offered in the review drill
+GRADES = {"again": 1, "hard": 3, "good": 4, "easy": 5}
+
+class Card:
+    """Scheduling state for one word in a learner's deck."""
+
+    __slots__ = ("word", "translation", "ease", "interval", "reps", "lapses", "due")
+
+    def __init__(self, word, translation="", ease=2.5, interval=0.0, reps=0, lapses=0, due=0.0):
+        self.word = word
+        self.translation = translation
+        self.ease = ease
+        self.interval = interval
+        self.reps = reps
+        self.lapses = lapses
+        self.due = due
+
+def sm2_review(card, quality, now):
+    """
+    Update a card with the SM-2 algorithm.
+
+    Args:
+        card (Card): The card being reviewed
+        quality (int): Recall quality from 0 (blackout) to 5 (perfect)
+        now (float): The review time as a Unix timestamp
+
+    Returns:
+        Card: The same card, rescheduled
+    """
+    if quality < 3:
+        # Failed recall: start the repetition sequence again, see it again soon
+        card.reps = 0
+        card.lapses += 1
+        card.interval = 0.0
+        card.due = now + 10 * 60
+    else:
+        if card.reps == 0:
+            card.interval = 1.0
+        elif card.reps == 1:
+            card.interval = 6.0
+        else:
+            card.interval = round(card.interval * card.ease, 1)
+        card.reps += 1
+        card.due = now + card.interval * DAY
+    card.ease = max(1.3, card.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return card
+
+#######################################
+# Deck
+#######################################
+class Deck:
+    """
+    One learner's cards for one language with a heap-ordered due queue.
+
+    The heap holds (due, word) entries. Rescheduling a card pushes a new entry
+    instead of searching the heap, and entries whose due time no longer
+    matches their card are skipped when they surface, so both peeking at the
+    next due cards and recording an answer are O(log n) per card.
+    """
+
+    def __init__(self, cards):
+        self.cards = {card.word: card for card in cards}
+        self.heap = [(card.due, card.word) for card in cards]
+        heapq.heapify(self.heap)
+
+    def _push(self, card):
+        heapq.heappush(self.heap, (card.due, card.word))
+        # Keep stale entries from outgrowing the live ones
+        if len(self.heap) > 2 * len(self.cards) + 64:
+            self.heap = [(card.due, card.word) for card in self.cards.values()]
+            heapq.heapify(self.heap)
+
+    def due(self, now, limit):
+        """Return up to limit cards due at or before now, most overdue first."""
+        found = []
+        while self.heap and len(found) < limit and self.heap[0][0] <= now:
+            due, word = heapq.heappop(self.heap)
+            card = self.cards.get(word)
+            if card is not None and card.due == due and card not in found:
+                found.append(card)
+        for card in found:
+            heapq.heappush(self.heap, (card.due, card.word))
+        return found
+
+    def add(self, card):
+        if card.word in self.cards:
+            return False
+        self.cards[card.word] = card
+        self._push(card)
+        return True
+
+    def reschedule(self, card):
+        self._push(card)
+
+#######################################
+# SRS Engine
+#######################################
+class SRSEngine:
+    """
+    Spaced-repetition vocabulary scheduler backed by SQLite.
+
+    Cards are stored as one compact row per (user, language, word). Decks are
+    loaded into memory on first use and kept in a small LRU, so drills are
+    local heap operations plus a single-row write, with no model call. Every
+    write bumps a per-deck version, and a cached deck is reloaded when the
+    stored version has moved on, so processes sharing the database don't
+    overwrite each other's answers with stale cards.
+    """
+
+    def __init__(self, path, max_decks=256):
+        self.path = path
+        self.max_decks = max_decks
+        self.decks = OrderedDict()
+        self.lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cards (
+                    user_id TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    word TEXT NOT NULL,
+                    translation TEXT NOT NULL DEFAULT '',
+                    ease REAL NOT NULL,
+                    interval REAL NOT NULL,
+                    reps INTEGER NOT NULL,
+                    lapses INTEGER NOT NULL,
+                    due REAL NOT NULL,
+                    PRIMARY KEY (user_id, language, word)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS decks (
+                    user_id TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, language)
+                ) WITHOUT ROWID
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @contextmanager
+    def _write(self):
+        """Open a connection holding the database write lock until it commits."""
+        with self._connect() as conn:
+            # Taken before the deck's version is checked, so no other process
+            # can write to it between the reload and the save
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+
+    def _deck(self, conn, user_id, language):
+        """Return a learner's deck, reloading it if the stored version is newer than the cached one."""
+        key = (user_id, language)
+        row = conn.execute(
+            "SELECT version FROM decks WHERE user_id = ? AND language = ?", key
+        ).fetchone()
+        version = row[0] if row else 0
+        cached = self.decks.get(key)
+        if cached is not None and cached[1] == version:
+            self.decks.move_to_end(key)
+            return cached[0]
+        rows = conn.execute(
+            "SELECT word, translation, ease, interval, reps, lapses, due FROM cards "
+            "WHERE user_id = ? AND language = ?",
+            key
+        ).fetchall()
+        deck = Deck([Card(*row) for row in rows])
+        self.decks[key] = (deck, version)
+        self.decks.move_to_end(key)
+        while len(self.decks) > self.max_decks:
+            self.decks.popitem(last=False)
+        return deck
+
+    def _save(self, conn, user_id, language, card):
+        conn.execute(
+            "INSERT OR REPLACE INTO cards (user_id, language, word, translation, ease, interval, reps, lapses, due) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id, language, card.word, card.translation, card.ease, card.interval,
+             card.reps, card.lapses, card.due)
+        )
+
+    def _bump_version(self, conn, user_id, language):
+        """Mark a deck as changed, keeping the cached copy current for this process."""
+        key = (user_id, language)
+        conn.execute(
+            "INSERT INTO decks (user_id, language, version) VALUES (?, ?, 1) "
+            "ON CONFLICT (user_id, language) DO UPDATE SET version = version + 1",
+            key
+        )
+        deck, version = self.decks[key]
+        self.decks[key] = (deck, version + 1)
+
+    def add_words(self, user_id, language, words, now=None):
+        """
+        Add new words to a learner's deck, due immediately.
+
+        Args:
+            user_id (str): The user's unique identifier
+            language (str): The language the words belong to
+            words (list): Words as strings or {"word": ..., "translation": ...} dicts
+            now (float): Optional Unix timestamp to schedule from
+
+        Returns:
+            int: Number of words that were new to the deck
+        """
+        now = time.time() if now is None else now
+        added = 0
+        with self.lock, self._write() as conn:
+            deck = self._deck(conn, user_id, language)
+            for entry in words:
+                if isinstance(entry, str):
+                    entry = {"word": entry}
+                word = entry.get("word", "").strip()
+                if not word:
+                    continue
+                card = Card(word, entry.get("translation", "") or "", due=now)
+                if deck.add(card):
+                    self._save(conn, user_id, language, card)
+                    added += 1
+            if added:
+                self._bump_version(conn, user_id, language)
+        logger.debug("Added %d words to %s deck for user %s", added, language, user_id)
+        return added
+
+    def due_cards(self, user_id, language, limit=10, now=None):
+        """
+        Get the cards a learner should review next.
+
+        Args:
+            user_id (str): The user's unique identifier
+            language (str): The deck's language
+            limit (int): Maximum number of cards to return
+            now (float): Optional Unix timestamp to check due dates against
+
+        Returns:
+            list: Due Card objects, most overdue first
+        """
+        now = time.time() if now is None else now
+        with self.lock, self._connect() as conn:
+            return self._deck(conn, user_id, language).due(now, limit)
+
+    def record_answer(self, user_id, language, word, quality, now=None):
+        """
+        Record how well a learner recalled a word and reschedule it.
+
+        Args:
+            user_id (str): The user's unique identifier
+            language (str): The deck's language
+            word (str): The reviewed word
+            quality (int | str): SM-2 quality 0-5, or a key of GRADES
+            now (float): Optional Unix timestamp of the review
+
+        Returns:
+            Card: The rescheduled card, or None if the word isn't in the deck
+        """
+        now = time.time() if now is None else now
+        quality = GRADES.get(quality, quality)
+        with self.lock, self._write() as conn:
+            deck = self._deck(conn, user_id, language)
+            card = deck.cards.get(word)
+            if card is None:
+                return None
+            sm2_review(card, quality, now)
+            deck.reschedule(card)
+            self._save(conn, user_id, language, card)
+            self._bump_version(conn, user_id, language)
+        return card
+
+    def words(self, user_id, language):
+        """
+        Get every word in a learner's deck.
+
+        Args:
+            user_id (str): The user's unique identifier
+            language (str): The deck's language
+
+        Returns:
+            set: The deck's words
+        """
+        with self.lock, self._connect() as conn:
+            return set(self._deck(conn, user_id, language).cards)
+
+    def stats(self, user_id, language, now=None):
+        """
+        Summarise a learner's deck.
+
+        Args:
+            user_id (str): The user's unique identifier
+            language (str): The deck's language
+            now (float): Optional Unix timestamp to check due dates against
+
+        Returns:
+            dict: Total card count and number currently due
+        """
+        now = time.time() if now is None else now
+        with self.lock, self._connect() as conn:
+            deck = self._deck(conn, user_id, language)
+            return {
+                "total": len(deck.cards),
+                "due": sum(1 for card in deck.cards.values() if card.due <= now),
+            }
@@ -1,19 +1,72 @@
 import os
 import uuid
 import json
-import logging
+import hashlib
+import tempfile
+import threading
+import time
+import numpy as np
 import streamlit as st
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pinecone import Pinecone, ServerlessSpec
 from openai import OpenAI
 from datetime import datetime, timezone
+from sub.quantization import QuantizedVectorStore
+from sub.resilience import (
+    CircuitOpenError, MemoryOutbox, configure_hedging, get_breaker, hedged_call, is_transient_error
+)
+from sub.scheduler import Scheduler, SchedulerOverloaded, scheduling
+from sub.srs import SRSEngine
+from sub.migration import load_checkpoint
+from sub.lexicon import LexiconSet
+from sub.logging_setup import get_logger, redact
 
-# Setup logging
-logging.basicConfig(level=logging.INFO, 
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-logger = logging.getLogger("language_app")
+# Logging is configured by the app (see sub/logging_setup.py), never at import
+logger = get_logger("memory")
 
 # Define constants
 USER_PROFILES_DIR = "user_profiles"
+EMBEDDING_MODEL = st.secrets.get("EMBEDDING_MODEL", "text-embedding-ada-002")
+EMBEDDING_DIMENSION = int(st.secrets.get("EMBEDDING_DIMENSION", 1536))
+
+# Optional cutover target while memories are re-embedded into a new index or namespace
+MIGRATION_NAMESPACE = st.secrets.get("MIGRATION_NAMESPACE")
+MIGRATION_INDEX_NAME = st.secrets.get("MIGRATION_INDEX_NAME")
+MIGRATION_EMBEDDING_MODEL = st.secrets.get("MIGRATION_EMBEDDING_MODEL", EMBEDDING_MODEL)
+MIGRATION_EMBEDDING_DIMENSION = int(st.secrets.get("MIGRATION_EMBEDDING_DIMENSION", EMBEDDING_DIMENSION))
+# Progress file written by `python -m sub.migration`; reads switch to the target once it reports done
+MIGRATION_CHECKPOINT = st.secrets.get("MIGRATION_CHECKPOINT", "embedding_migration.json")
+
+# Fail-fast settings: request timeout, and how long to wait before hedging a slow read
+OPENAI_TIMEOUT = float(st.secrets.get("OPENAI_TIMEOUT", 20))
+EMBEDDING_HEDGE_AFTER = float(st.secrets.get("EMBEDDING_HEDGE_AFTER", 1.5))
+INDEX_HEDGE_AFTER = float(st.secrets.get("INDEX_HEDGE_AFTER", 1.0))
+INDEX_TIMEOUT = float(st.secrets.get("INDEX_TIMEOUT", 10))
+OUTBOX_PATH = st.secrets.get("OUTBOX_PATH", "memory_outbox.db")
+SRS_DB_PATH = st.secrets.get("SRS_DB_PATH", "srs.db")
+# Approximate token budget for the memories injected into the system prompt
+MEMORY_TOKEN_BUDGET = int(st.secrets.get("MEMORY_TOKEN_BUDGET", 400))
+# Directory of per-language CEFR lexicon indexes built with `python -m sub.lexicon build`
+LEXICON_DIR = st.secrets.get("LEXICON_DIR", "lexicons")
+
+# Process-wide caches warmed by the lesson prefetch and reused across turns
+EMBEDDING_CACHE_SIZE = int(st.secrets.get("EMBEDDING_CACHE_SIZE", 2048))
+RETRIEVAL_CACHE_SIZE = int(st.secrets.get("RETRIEVAL_CACHE_SIZE", 1024))
+RETRIEVAL_CACHE_TTL = float(st.secrets.get("RETRIEVAL_CACHE_TTL", 120))
+
+# Admission control for every outbound OpenAI and Pinecone call made by the app
+scheduler = Scheduler(
+    max_concurrency=int(st.secrets.get("SCHEDULER_MAX_CONCURRENCY", 16)),
+    global_rate=float(st.secrets.get("SCHEDULER_GLOBAL_RATE", 50)),
+    global_burst=int(st.secrets.get("SCHEDULER_GLOBAL_BURST", 100)),
+    user_rate=float(st.secrets.get("SCHEDULER_USER_RATE", 3)),
+    user_burst=int(st.secrets.get("SCHEDULER_USER_BURST", 20)),
+)
+# Every admitted call may have a primary and a losing attempt still running
+configure_hedging(2 * scheduler.max_concurrency)
+# Queue depth, shed counts and wait percentiles go to the "scheduler" log category
+scheduler.start_metrics_logging(float(st.secrets.get("SCHEDULER_METRICS_INTERVAL", 60)))
 
 # Create user profiles directory if it doesn't exist
 if not os.path.exists(USER_PROFILES_DIR):
@@ -32,7 +85,7 @@ try:
         # Create the index if it doesn't exist
         pc.create_index(
             name=index_name,
-            dimension=1536,  # OpenAI embedding dimension
+            dimension=EMBEDDING_DIMENSION,  # OpenAI embedding dimension
             metric="cosine",
             spec=ServerlessSpec(cloud="aws", region=st.secrets["PINECONE_ENVIRONMENT"])
         )
@@ -43,10 +96,16 @@ try:
     logger.info(f"Successfully connected to Pinecone index {index_name}")
 except Exception as e:
     logger.error(f"Error connecting to Pinecone: {str(e)}")
+    pc = None
     # Create a fallback for development/testing
     class DummyIndex:
         def __init__(self):
+            # One compressed vector store per user, quantized per LOCAL_VECTOR_QUANTIZATION.
+            # Full vectors for the exact re-rank are spilled to a temporary directory.
             self.memories = {}
+            self.owners = {}
+            self.quantization = st.secrets.get("LOCAL_VECTOR_QUANTIZATION", "int8")
+            self.spill_dir = tempfile.mkdtemp(prefix="language_app_vectors_")
             logger.warning("Using DummyIndex which stores memories in memory only (data will be lost on restart)")
             
         def upsert(self, vectors, namespace=None):
@@ -54,14 +113,20 @@ except Exception as e:
                 for vector in vectors:
                     user_id = vector["metadata"]["user_id"]
                     if user_id not in self.memories:
-                        self.memories[user_id] = []
-                    self.memories[user_id].append(vector["metadata"]["payload"])
+                        spill_name = hashlib.sha1(user_id.encode()).hexdigest()
+                        self.memories[user_id] = QuantizedVectorStore(
+                            dimension=len(vector["values"]), mode=self.quantization,
+                            full_vectors_path=os.path.join(self.spill_dir, f"{spill_name}.f32")
+                        )
+                    # Like Pinecone, upserting an existing id replaces its vector and metadata
+                    self.memories[user_id].add([vector["id"]], [vector["values"]], [vector["metadata"]])
+                    self.owners[vector["id"]] = user_id
                 return {"upserted_count": len(vectors)}
             except Exception as e:
                 logger.error(f"Error in DummyIndex upsert: {str(e)}")
                 return {"upserted_count": 0, "error": str(e)}
             
-        def query(self, vector, filter=None, namespace=None, include_metadata=True, top_k=10):
+        def query(self, vector, filter=None, namespace=None, include_metadata=True, include_values=False, top_k=10):
             try:
                 # Extract user_id from filter
                 user_id = "unknown"
@@ -74,25 +139,107 @@ except Exception as e:
                 
                 matches = []
                 if user_id in self.memories:
-                    for memory in self.memories[user_id]:
+                    store = self.memories[user_id]
+                    for memory_id, score, metadata in store.search(vector, top_k=top_k):
                         # Create a match object similar to Pinecone's response
                         match = type('obj', (object,), {
-                            'id': str(uuid.uuid4()),
-                            'score': 0.9,  # Dummy score
-                            'metadata': {'payload': memory}
+                            'id': memory_id,
+                            'score': score,
+                            'metadata': metadata,
+                            'values': store.get(memory_id)[0].tolist() if include_values else []
                         })
                         matches.append(match)
                 
-                return {"matches": matches[:top_k]}
+                return {"matches": matches}
             except Exception as e:
                 logger.error(f"Error in DummyIndex query: {str(e)}")
                 return {"matches": [], "error": str(e)}
+        
+        def list(self, prefix="", namespace=None, limit=100):
+            # Yield pages of ids like Pinecone's list()
+            page = []
+            for memory_id in self.owners:
+                if memory_id.startswith(prefix):
+                    page.append(memory_id)
+                    if len(page) == limit:
+                        yield page
+                        page = []
+            if page:
+                yield page
+        
+        def fetch(self, ids, namespace=None):
+            vectors = {}
+            for memory_id in ids:
+                if memory_id in self.owners:
+                    values, metadata = self.memories[self.owners[memory_id]].get(memory_id)
+                    vectors[memory_id] = type('obj', (object,), {
+                        'id': memory_id,
+                        'values': values.tolist(),
+                        'metadata': metadata
+                    })
+            return type('obj', (object,), {'vectors': vectors})
     
     index = DummyIndex()
     logger.warning("Using dummy in-memory index as fallback")
 
 # Initialize OpenAI for embeddings 
-client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"], timeout=OPENAI_TIMEOUT, max_retries=1)
+
+def _is_retryable_write(error):
+    """Whether a failed memory write is worth journaling and replaying."""
+    # A shed write only needs to wait for capacity; a 400 would fail the same way again
+    return isinstance(error, SchedulerOverloaded) or is_transient_error(error)
+
+# Journal for memory writes that fail, replayed in the background
+outbox = MemoryOutbox(OUTBOX_PATH, is_retryable=_is_retryable_write)
+
+# Memory writes made during a chat turn run here, off the turn's critical path
+_memory_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory-writer")
+
+# Spaced-repetition vocabulary decks, drilled locally without model calls
+srs = SRSEngine(SRS_DB_PATH)
+lexicons = LexiconSet(LEXICON_DIR)
+
+# Cache of secondary index handles opened by get_index
+_index_handles = {}
+
+class _Cache:
+    """Thread-safe LRU cache with optional expiry, shared by every session in the process."""
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            expires = time.monotonic() + self.ttl if self.ttl else None
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def discard_where(self, predicate):
+        with self.lock:
+            for key in [key for key in self.entries if predicate(key)]:
+                del self.entries[key]
+
+# Embeddings keyed by (model, dimension, text); retrieval results keyed by (user_id, search text)
+_embedding_cache = _Cache(EMBEDDING_CACHE_SIZE)
+_retrieval_cache = _Cache(RETRIEVAL_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL)
 
 # Define the tools
 TOOLS = [
@@ -110,6 +257,30 @@ TOOLS = [
             },
         },
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "save_vocabulary",
+            "description": "Add new words the user is learning to their spaced-repetition review deck",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "words": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "word": {"type": "string"},
+                                "translation": {"type": "string"}
+                            },
+                            "required": ["word"]
+                        }
+                    }
+                },
+                "required": ["words"]
+            },
+        },
+    },
 ]
 
 #######################################
@@ -141,7 +312,7 @@ def save_user_profile(user_id, profile_data):
     profile_path = get_user_profile_path(user_id)
     with open(profile_path, 'w') as f:
         json.dump(profile_data, f)
-    logger.info(f"Saved profile for user {user_id}")
+    logger.debug("Saved profile for user %s", user_id)
 
 def load_user_profile(user_id):
     """
@@ -158,7 +329,7 @@ def load_user_profile(user_id):
         try:
             with open(profile_path, 'r') as f:
                 profile_data = json.load(f)
-                logger.info(f"Loaded existing profile for user {user_id}")
+                logger.debug("Loaded existing profile for user %s", user_id)
                 return profile_data
         except Exception as e:
             logger.error(f"Error loading user profile: {str(e)}")
@@ -175,26 +346,261 @@ def load_user_profile(user_id):
             "mode": None
         }
     }
-    logger.info(f"Created new profile for user {user_id}")
+    logger.debug("Created new profile for user %s", user_id)
     return new_profile
 
 
-def get_embeddings(string_to_embed):
-    try:
-        response = client.embeddings.create(
-            input=string_to_embed,
-            model="text-embedding-ada-002"
+#######################################
+# Embedding and Index Functions
+#######################################
+def _embedding_options(model, dimension):
+    """Request a specific output dimension from models that support shortening."""
+    return {} if model == "text-embedding-ada-002" else {"dimensions": dimension}
+
+def get_index(index_name=None, dimension=EMBEDDING_DIMENSION):
+    """
+    Get a handle to a Pinecone index, creating it if it doesn't exist.
+    
+    Args:
+        index_name (str): The index to connect to, or None for the primary index
+        dimension (int): The vector dimension to use if the index must be created
+        
+    Returns:
+        object: The index handle (the primary index when running on the dummy fallback)
+    """
+    if not index_name or pc is None or index_name == st.secrets.get("PINECONE_INDEX_NAME"):
+        return index
+    if index_name in _index_handles:
+        return _index_handles[index_name]
+    if index_name not in [existing.name for existing in pc.list_indexes()]:
+        pc.create_index(
+            name=index_name,
+            dimension=dimension,
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region=st.secrets["PINECONE_ENVIRONMENT"])
         )
-        return response.data[0].embedding
-    except Exception as e:
-        logger.error(f"Error generating embeddings: {str(e)}")
-        # Return a dummy embedding for fallback
-        return [0.0] * 1536  # Typical embedding size
+        logger.info(f"Created new Pinecone index: {index_name}")
+    _index_handles[index_name] = pc.Index(index_name)
+    return _index_handles[index_name]
+
+def get_embeddings_batch(strings_to_embed, model=EMBEDDING_MODEL, dimension=EMBEDDING_DIMENSION):
+    """
+    Embed several strings with a single API request.
+    
+    Args:
+        strings_to_embed (list): The texts to embed
+        model (str): The embedding model to use
+        dimension (int): The output dimension (honoured by text-embedding-3 models)
+        
+    Returns:
+        list: One embedding per input string, in input order
+    """
+    response = get_breaker("embeddings").call(
+        client.embeddings.create,
+        input=strings_to_embed, model=model, **_embedding_options(model, dimension)
+    )
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+def get_embeddings(string_to_embed, model=EMBEDDING_MODEL, dimension=EMBEDDING_DIMENSION, cache=True):
+    """
+    Embed a string, hedging slow requests and failing fast while the API is down.
+    
+    Query embeddings are cached as float32 arrays, so repeated texts such as
+    the fixed "recent conversation history" query are only embedded once per
+    process. Memory writes pass cache=False: their timestamped texts are
+    never embedded again and would only push queries out of the cache.
+    
+    Args:
+        string_to_embed (str): The text to embed
+        model (str): The embedding model to use
+        dimension (int): The output dimension (honoured by text-embedding-3 models)
+        cache (bool): Whether to read and store the result in the embedding cache
+        
+    Returns:
+        list: The embedding vector
+        
+    Raises:
+        CircuitOpenError: If recent embedding calls have kept failing
+        SchedulerOverloaded: If the call was shed by admission control
+    """
+    cache_key = (model, dimension, string_to_embed)
+    if cache and (cached := _embedding_cache.get(cache_key)) is not None:
+        return cached.tolist()
+    
+    response = scheduler.run(
+        get_breaker("embeddings").call,
+        hedged_call,
+        client.embeddings.create,
+        hedge_after=EMBEDDING_HEDGE_AFTER,
+        admission=scheduler,
+        timeout=OPENAI_TIMEOUT,
+        input=string_to_embed,
+        model=model,
+        **_embedding_options(model, dimension)
+    )
+    embedding = response.data[0].embedding
+    if cache:
+        _embedding_cache.put(cache_key, np.asarray(embedding, dtype=np.float32))
+    return embedding
+
+def query_index(target_index, **kwargs):
+    """
+    Query an index through its circuit breaker, hedging slow requests.
+    
+    Args:
+        target_index: The index handle to query
+        **kwargs: Arguments for the index's query method
+        
+    Returns:
+        object: The query response
+    """
+    return scheduler.run(
+        get_breaker("index").call, hedged_call, target_index.query,
+        hedge_after=INDEX_HEDGE_AFTER, admission=scheduler, timeout=INDEX_TIMEOUT, **kwargs
+    )
+
+def upsert_index(target_index, **kwargs):
+    """
+    Upsert into an index through its circuit breaker.
+    
+    Args:
+        target_index: The index handle to write to
+        **kwargs: Arguments for the index's upsert method
+        
+    Returns:
+        object: The upsert response
+    """
+    return scheduler.run(get_breaker("index").call, target_index.upsert, **kwargs)
+
+def get_migration_target():
+    """
+    Get the cutover target configured through the MIGRATION_* secrets.
+    
+    Returns:
+        dict: The target index, namespace, model and dimension, or None if no migration is active
+    """
+    if not MIGRATION_NAMESPACE:
+        return None
+    return {
+        "index": get_index(MIGRATION_INDEX_NAME, MIGRATION_EMBEDDING_DIMENSION),
+        "namespace": MIGRATION_NAMESPACE,
+        "model": MIGRATION_EMBEDDING_MODEL,
+        "dimension": MIGRATION_EMBEDDING_DIMENSION,
+    }
+
+_backfill_status = {"done": False, "checked_at": None}
+_backfill_lock = threading.Lock()
+
+def migration_backfill_done():
+    """
+    Check whether the migration job has checkpointed the target as fully backfilled.
+    
+    The checkpoint is re-read at most once a minute, and only until it reports done.
+    
+    Returns:
+        bool: Whether the target holds every memory and can serve reads
+    """
+    with _backfill_lock:
+        now = time.monotonic()
+        if _backfill_status["done"] or (
+                _backfill_status["checked_at"] is not None and now - _backfill_status["checked_at"] < 60):
+            return _backfill_status["done"]
+        _backfill_status["checked_at"] = now
+        try:
+            checkpoint = load_checkpoint(MIGRATION_CHECKPOINT)
+        except Exception as e:
+            logger.warning(f"Could not read migration checkpoint {MIGRATION_CHECKPOINT}: {str(e)}")
+            checkpoint = None
+        _backfill_status["done"] = bool(checkpoint and checkpoint.get("done") and (
+            checkpoint.get("target_namespace"), checkpoint.get("model"), checkpoint.get("dimension")
+        ) == (MIGRATION_NAMESPACE, MIGRATION_EMBEDDING_MODEL, MIGRATION_EMBEDDING_DIMENSION))
+        if _backfill_status["done"]:
+            logger.info("Embedding migration backfill is complete, reading memories from the target")
+        return _backfill_status["done"]
+
+def memory_id_prefix(user_id):
+    """
+    Get the id prefix shared by all of a user's memories.
+    
+    User ids are free text, so "%" and "#" are percent-escaped; otherwise the
+    prefix of user "alice" would also match memories of user "alice#evil".
+    
+    Args:
+        user_id (str): The user's unique identifier
+        
+    Returns:
+        str: The escaped user id followed by "#"
+    """
+    return user_id.replace("%", "%25").replace("#", "%23") + "#"
+
+def make_memory_id(user_id):
+    """
+    Create a new memory id prefixed with the user's id.
+    
+    The prefix lets a user's memories be listed by id without a metadata query.
+    
+    Args:
+        user_id (str): The user's unique identifier
+        
+    Returns:
+        str: The memory id
+    """
+    return f"{memory_id_prefix(user_id)}{uuid.uuid4()}"
+
+def _write_memory(memory_id, user_id, enhanced_memory, timestamp):
+    """
+    Embed a memory and upsert it, raising if either step fails.
+    
+    Args:
+        memory_id (str): The id to store the memory under
+        user_id (str): The user's unique identifier
+        enhanced_memory (str): The timestamped memory text
+        timestamp (str): The memory's creation time
+        
+    Returns:
+        object: The upsert response
+    """
+    # Step 1: Embed the memory
+    vector = get_embeddings(enhanced_memory, cache=False)
+    
+    # Step 2: Build the vector document to be stored
+    metadata = {
+        "payload": enhanced_memory,
+        "timestamp": timestamp,
+        "type": "recall", # Define the type of document i.e recall memory
+        "user_id": user_id,
+    }
+    
+    # Step 3: Store the vector document in the vector database
+    result = upsert_index(
+        index,
+        vectors=[{"id": memory_id, "values": vector, "metadata": metadata}],
+        namespace=st.secrets.get("PINECONE_NAMESPACE", "default")
+    )
+    
+    # Step 4: During an embedding migration, dual-write so the target never falls behind
+    if target := get_migration_target():
+        target_vector = get_embeddings(
+            enhanced_memory, model=target["model"], dimension=target["dimension"], cache=False
+        )
+        upsert_index(
+            target["index"],
+            vectors=[{"id": memory_id, "values": target_vector, "metadata": metadata}],
+            namespace=target["namespace"]
+        )
+    
+    # Cached retrievals for this user no longer include everything they should
+    _retrieval_cache.discard_where(lambda key: key[0] == user_id)
+    return result
 
 def save_memory(memory, user_id="1234"):
     """
     Save a memory to the vector database with user_id tag
     
+    If the embedding or index call fails transiently the write is journaled to
+    the outbox and replayed in the background, so the memory isn't lost.
+    Permanent errors, such as a 400 for an over-long memory, are only logged.
+    
     Args:
         memory (str): The memory text to save
         user_id (str): The user's unique identifier
@@ -207,86 +613,145 @@ def save_memory(memory, user_id="1234"):
         current_time = datetime.now(tz=timezone.utc)
         formatted_time = current_time.strftime("%Y-%m-%d %H:%M:%S UTC")
         enhanced_memory = f"[{formatted_time}] {memory}"
+        memory_id = make_memory_id(user_id)
         
-        logger.info(f"Saving memory for user {user_id}: {memory[:50]}...")
-        
-        # Step 1: Embed the memory
-        vector = get_embeddings(enhanced_memory)
+        logger.debug("Saving memory for user %s: %s", user_id, redact(memory))
         
-        # Step 2: Build the vector document to be stored
-        memory_id = str(uuid.uuid4())
-        
-        # Step 3: Store the vector document in the vector database
-        result = index.upsert(
-            vectors=[
-                {
-                    "id": memory_id,
-                    "values": vector,
-                    "metadata": {
-                        "payload": enhanced_memory,
-                        "timestamp": str(current_time),
-                        "type": "recall", # Define the type of document i.e recall memory
-                        "user_id": user_id,
-                    },
-                }
-            ],
-            namespace=st.secrets.get("PINECONE_NAMESPACE", "default")
-        )
+        try:
+            # Memory writes queue behind interactive calls
+            with scheduling(user_id, priority="background"):
+                _write_memory(memory_id, user_id, enhanced_memory, str(current_time))
+        except Exception as e:
+            if not _is_retryable_write(e):
+                raise
+            outbox.enqueue(memory_id, user_id, enhanced_memory, str(current_time), error=str(e))
+            return f"Memory queued for retry: {str(e)}"
         
-        logger.info(f"Memory saved successfully: {result}")
+        logger.debug("Memory %s saved", memory_id)
         return "Memory saved successfully"
     except Exception as e:
         logger.error(f"Error saving memory: {str(e)}")
         return f"Error saving memory: {str(e)}"
 
-def load_memories(prompt, user_id="1234"):
+def save_memory_async(memory, user_id="1234"):
     """
-    Load relevant memories for a user based on a prompt
+    Save a memory in the background so the caller doesn't wait for it.
+    
+    Failed writes still land in the outbox, exactly as with save_memory.
+    
+    Args:
+        memory (str): The memory text to save
+        user_id (str): The user's unique identifier
+        
+    Returns:
+        None
+    """
+    _memory_writer.submit(save_memory, memory, user_id=user_id)
+
+def load_memory_matches(prompt, user_id="1234", raise_errors=False):
+    """
+    Load relevant memories for a user along with their scores and vectors
+    
+    Results are cached for RETRIEVAL_CACHE_TTL seconds, or until the user's
+    next memory write, so a prefetch at lesson start serves the first turn.
     
     Args:
         prompt (str): The prompt to find relevant memories for
         user_id (str): The user's unique identifier
+        raise_errors (bool): Re-raise lookup failures instead of returning no memories
         
     Returns:
-        list: List of relevant memories
+        list: Dicts with "id", "payload", "score" and "values" (the stored
+              embedding, or None if the index didn't return it), best match first
     """
     try:
-        logger.info(f"Loading memories for user {user_id} with prompt: {prompt[:50]}...")
+        logger.debug("Loading memories for user %s with prompt: %s", user_id, redact(prompt))
         
         # If prompt is empty, just retrieve recent memories
         search_text = prompt if prompt else "recent memories"
         
-        top_k = 10
-        vector = get_embeddings(search_text)
+        if (cached := _retrieval_cache.get((user_id, search_text))) is not None:
+            return list(cached)
         
-        filter_dict = {
-            "$and": [
-                {"user_id": {"$eq": user_id}},
-                {"type": {"$eq": "recall"}}
-            ]
+        top_k = 10
+        # Scores from two embedding models aren't comparable, so each query reads one
+        # namespace: the current one, or the migration target once it is fully backfilled.
+        # Dual-writes keep the current namespace complete until cutover.
+        source = {
+            "index": index,
+            "namespace": st.secrets.get("PINECONE_NAMESPACE", "default"),
+            "model": EMBEDDING_MODEL,
+            "dimension": EMBEDDING_DIMENSION,
         }
+        if (target := get_migration_target()) and migration_backfill_done():
+            source = target
         
-        namespace = st.secrets.get("PINECONE_NAMESPACE", "default")
-        logger.info(f"Querying namespace: {namespace} with filter: {filter_dict}")
+        # Retrieval is on the user's turn, so it is scheduled as interactive
+        with scheduling(user_id, priority="interactive"):
+            vector = get_embeddings(search_text, model=source["model"], dimension=source["dimension"])
         
-        response = index.query(
-            vector=vector,
-            filter=filter_dict,
-            namespace=namespace,
-            include_metadata=True,
-            top_k=top_k,
-        )
+            filter_dict = {
+                "$and": [
+                    {"user_id": {"$eq": user_id}},
+                    {"type": {"$eq": "recall"}}
+                ]
+            }
         
-        memories = []
-        if matches := response.get("matches"):
-            logger.info(f"Found {len(matches)} matching memories")
-            memories = [m.metadata["payload"] for m in matches]
-            for memory in memories[:3]:  # Log first few for debugging
-                logger.info(f"Memory sample: {memory[:100]}...")
-        else:
-            logger.warning(f"No memories found for user {user_id}")
-            
-        return memories
+            logger.debug("Querying namespace %s", source["namespace"])
+        
+            response = query_index(
+                source["index"],
+                vector=vector,
+                filter=filter_dict,
+                namespace=source["namespace"],
+                include_metadata=True,
+                include_values=True,
+                top_k=top_k,
+            )
+            matches = [
+                {
+                    "id": m.id,
+                    "payload": m.metadata["payload"],
+                    "score": m.score,
+                    # float32 arrays keep cached results small
+                    "values": np.asarray(m.values, dtype=np.float32) if getattr(m, "values", None) else None,
+                }
+                for m in response.get("matches") or []
+            ]
+        
+        logger.debug("Found %d matching memories for user %s", len(matches), user_id)
+        
+        _retrieval_cache.put((user_id, search_text), list(matches))
+        return matches
+    except (CircuitOpenError, SchedulerOverloaded) as e:
+        # Degrade to answering without memories rather than stalling the turn
+        logger.warning(f"Skipping memory retrieval: {str(e)}")
+        if raise_errors:
+            raise
+        return []
     except Exception as e:
         logger.error(f"Error loading memories: {str(e)}")
-        return [f"Error loading memories: {str(e)}"]
\ No newline at end of file
+        if raise_errors:
+            raise
+        return []
+
+def load_memories(prompt, user_id="1234", raise_errors=False):
+    """
+    Load relevant memories for a user based on a prompt
+    
+    Args:
+        prompt (str): The prompt to find relevant memories for
+        user_id (str): The user's unique identifier
+        raise_errors (bool): Re-raise lookup failures instead of returning no memories
+        
+    Returns:
+        list: List of relevant memories
+    """
+    return [match["payload"] for match in load_memory_matches(prompt, user_id=user_id, raise_errors=raise_errors)]
+
+def _replay_memory(memory_id, user_id, enhanced_memory, timestamp):
+    with scheduling(user_id, priority="background"):
+        _write_memory(memory_id, user_id, enhanced_memory, timestamp)
+
+# Replay journaled memory writes in the background
+outbox.start(_replay_memory)
\ No newline at end of file
@@ -0,0 +1,346 @@
+import os
+import json
+import streamlit as st
+from datetime import datetime, timezone
+from sub.tools import (
+    index,
+    get_embeddings_batch,
+    get_migration_target,
+    get_user_profile_path,
+    load_user_profile,
+    save_user_profile,
+    memory_id_prefix,
+    EMBEDDING_MODEL,
+    EMBEDDING_DIMENSION
+)
+from sub.logging_setup import configure_logging, get_logger
+
+logger = get_logger("transfer")
+
+# Pinecone fetches at most 100 ids per request and accepts ~100 vectors per upsert
+FETCH_BATCH_SIZE = 100
+UPSERT_BATCH_SIZE = 100
+# Largest top_k a filtered query may use, which bounds the legacy id fallback
+LEGACY_QUERY_LIMIT = 10000
+
+#######################################
+# Export Functions
+#######################################
+def _memory_filter(user_id):
+    return {
+        "$and": [
+            {"user_id": {"$eq": user_id}},
+            {"type": {"$eq": "recall"}}
+        ]
+    }
+
+def iter_memory_ids(user_id, namespace, include_legacy=True):
+    """
+    Yield pages of a user's memory ids.
+
+    Memories saved with make_memory_id are listed by their memory_id_prefix().
+    Older memories with bare uuid ids can only be found with a filtered query,
+    which Pinecone caps at LEGACY_QUERY_LIMIT results.
+
+    Args:
+        user_id (str): The user's unique identifier
+        namespace (str): The namespace to read from
+        include_legacy (bool): Whether to also look up memories saved before id prefixes
+
+    Yields:
+        list: A page of memory ids
+    """
+    prefix = memory_id_prefix(user_id)
+    for page in index.list(prefix=prefix, namespace=namespace):
+        yield list(page)
+
+    if not include_legacy:
+        return
+
+    # Any non-zero vector works because only the filter matters here
+    probe = [1.0] * EMBEDDING_DIMENSION
+    response = index.query(
+        vector=probe,
+        filter=_memory_filter(user_id),
+        namespace=namespace,
+        include_metadata=False,
+        top_k=LEGACY_QUERY_LIMIT,
+    )
+    legacy_ids = [m.id for m in response.get("matches") or [] if not m.id.startswith(prefix)]
+    if len(response.get("matches") or []) == LEGACY_QUERY_LIMIT:
+        logger.warning(f"Legacy memory lookup for user {user_id} hit the {LEGACY_QUERY_LIMIT} result cap")
+    for start in range(0, len(legacy_ids), FETCH_BATCH_SIZE):
+        yield legacy_ids[start:start + FETCH_BATCH_SIZE]
+
+def iter_memories(user_id, namespace=None, include_values=True):
+    """
+    Stream a user's memories out of the vector database one fetch at a time.
+
+    Args:
+        user_id (str): The user's unique identifier
+        namespace (str): The namespace to read from, defaulting to PINECONE_NAMESPACE
+        include_values (bool): Whether to include the stored embedding vectors
+
+    Yields:
+        dict: A memory record with id, metadata and optionally values
+    """
+    namespace = namespace or st.secrets.get("PINECONE_NAMESPACE", "default")
+    for page in iter_memory_ids(user_id, namespace):
+        for start in range(0, len(page), FETCH_BATCH_SIZE):
+            fetched = index.fetch(ids=page[start:start + FETCH_BATCH_SIZE], namespace=namespace)
+            for vector in fetched.vectors.values():
+                # Never let an id collision leak another user's memory into the export
+                if (vector.metadata or {}).get("user_id") != user_id:
+                    logger.warning(f"Skipping memory {vector.id} that belongs to another user")
+                    continue
+                record = {"id": vector.id, "metadata": dict(vector.metadata or {})}
+                if include_values:
+                    record["values"] = [float(x) for x in vector.values]
+                yield record
+
+def _export_header(user_id, include_values):
+    return {
+        "user_id": user_id,
+        "profile": load_user_profile(user_id),
+        "exported_at": datetime.now(tz=timezone.utc).isoformat(),
+        "embedding_model": EMBEDDING_MODEL if include_values else None,
+        "embedding_dimension": EMBEDDING_DIMENSION if include_values else None,
+    }
+
+def export_user_jsonl(user_id, path, namespace=None, include_values=True):
+    """
+    Write a user's profile and memories to a JSON Lines file.
+
+    The first line is a {"kind": "profile"} header holding the user_profiles
+    JSON; every following line is one {"kind": "memory"} record. Records are
+    written as they are fetched, so memory use stays constant.
+
+    Args:
+        user_id (str): The user's unique identifier
+        path (str): The output file path
+        namespace (str): The namespace to read from
+        include_values (bool): Whether to export embedding vectors for reuse on import
+
+    Returns:
+        int: Number of memories exported
+    """
+    count = 0
+    with open(path, "w") as f:
+        f.write(json.dumps({"kind": "profile", **_export_header(user_id, include_values)}) + "\n")
+        for record in iter_memories(user_id, namespace, include_values):
+            f.write(json.dumps({"kind": "memory", **record}) + "\n")
+            count += 1
+    logger.info(f"Exported {count} memories for user {user_id} to {path}")
+    return count
+
+def export_user_parquet(user_id, path, namespace=None, include_values=True, row_group_size=1000):
+    """
+    Write a user's memories to a Parquet file, one row group at a time.
+
+    The profile header is stored in the file's key-value metadata under
+    "language_app_export". Requires pyarrow.
+
+    Args:
+        user_id (str): The user's unique identifier
+        path (str): The output file path
+        namespace (str): The namespace to read from
+        include_values (bool): Whether to export embedding vectors for reuse on import
+        row_group_size (int): Number of memories buffered per row group
+
+    Returns:
+        int: Number of memories exported
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow: pip install pyarrow")
+
+    fields = [("id", pa.string()), ("metadata", pa.string())]
+    if include_values:
+        fields.append(("values", pa.list_(pa.float32())))
+    schema = pa.schema(fields, metadata={
+        "language_app_export": json.dumps(_export_header(user_id, include_values))
+    })
+
+    count = 0
+    buffer = []
+    with pq.ParquetWriter(path, schema) as writer:
+        def flush():
+            columns = {
+                "id": [r["id"] for r in buffer],
+                "metadata": [json.dumps(r["metadata"]) for r in buffer],
+            }
+            if include_values:
+                columns["values"] = [r["values"] for r in buffer]
+            writer.write_table(pa.table(columns, schema=schema))
+            buffer.clear()
+
+        for record in iter_memories(user_id, namespace, include_values):
+            buffer.append(record)
+            count += 1
+            if len(buffer) == row_group_size:
+                flush()
+        if buffer:
+            flush()
+    logger.info(f"Exported {count} memories for user {user_id} to {path}")
+    return count
+
+#######################################
+# Import Functions
+#######################################
+def _read_jsonl(path):
+    """Return the export header and an iterator over memory records."""
+    f = open(path, "r")
+    header = json.loads(f.readline())
+    if header.get("kind") != "profile":
+        f.close()
+        raise ValueError(f"{path} does not start with a profile header")
+
+    def records():
+        with f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if record.get("kind") == "memory":
+                        yield record
+    return header, records()
+
+def _read_parquet(path, batch_size=UPSERT_BATCH_SIZE):
+    """Return the export header and an iterator over memory records."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet import requires pyarrow: pip install pyarrow")
+
+    parquet_file = pq.ParquetFile(path)
+    header = json.loads(parquet_file.schema_arrow.metadata[b"language_app_export"])
+
+    def records():
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            for row in batch.to_pylist():
+                row["metadata"] = json.loads(row["metadata"])
+                yield row
+    return header, records()
+
+def _embed_missing(batch, reuse_vectors, **options):
+    """Return a vector for every record, reusing exported vectors where allowed."""
+    vectors = [r.get("values") if reuse_vectors else None for r in batch]
+    missing = [i for i, vector in enumerate(vectors) if not vector]
+    if missing:
+        embedded = get_embeddings_batch([batch[i]["metadata"]["payload"] for i in missing], **options)
+        for i, vector in zip(missing, embedded):
+            vectors[i] = vector
+    return vectors
+
+def _flush_import(batch, namespace, reuse_vectors, target=None, reuse_target_vectors=False):
+    """Embed (if needed) and upsert one batch of imported memories, dual-writing to a migration target."""
+    vectors = _embed_missing(batch, reuse_vectors)
+    index.upsert(
+        vectors=[{"id": r["id"], "values": v, "metadata": r["metadata"]} for r, v in zip(batch, vectors)],
+        namespace=namespace
+    )
+
+    # Like save_memory during an embedding migration, so the target doesn't miss
+    # imported memories whose ids the migration job has already passed
+    if target:
+        target_vectors = _embed_missing(
+            batch, reuse_target_vectors, model=target["model"], dimension=target["dimension"]
+        )
+        target["index"].upsert(
+            vectors=[{"id": r["id"], "values": v, "metadata": r["metadata"]} for r, v in zip(batch, target_vectors)],
+            namespace=target["namespace"]
+        )
+    return len(batch)
+
+def import_user(path, user_id=None, namespace=None, reuse_vectors=True, overwrite_profile=True):
+    """
+    Restore a user's profile and memories from a JSON Lines or Parquet export.
+
+    Records are streamed from the file and upserted in batches. Stored vectors
+    are reused when the export was made with the same embedding model and
+    dimension; otherwise the memories are re-embedded in batches. Memory ids are
+    kept, so importing the same file twice overwrites rather than duplicates.
+    While an embedding migration is configured, imports into the current
+    namespace are also written to the migration target with its model.
+
+    Args:
+        path (str): The export file (.jsonl or .parquet)
+        user_id (str): Import under this user id instead of the exported one
+        namespace (str): The namespace to write to, defaulting to PINECONE_NAMESPACE
+        reuse_vectors (bool): Whether to reuse exported vectors instead of re-embedding
+        overwrite_profile (bool): Whether to replace an existing local profile
+
+    Returns:
+        int: Number of memories imported
+    """
+    current_namespace = st.secrets.get("PINECONE_NAMESPACE", "default")
+    namespace = namespace or current_namespace
+    header, records = _read_parquet(path) if path.endswith(".parquet") else _read_jsonl(path)
+
+    source_user_id = header["user_id"]
+    user_id = user_id or source_user_id
+    exported_with = (header.get("embedding_model"), header.get("embedding_dimension"))
+    # Exported vectors are only reusable in the embedding space they came from
+    reuse_target_vectors = reuse_vectors
+    if reuse_vectors and exported_with != (EMBEDDING_MODEL, EMBEDDING_DIMENSION):
+        logger.warning(f"{path} was exported with {header.get('embedding_model')}, re-embedding memories")
+        reuse_vectors = False
+
+    # The migration target mirrors the current namespace only
+    target = get_migration_target() if namespace == current_namespace else None
+    if target:
+        reuse_target_vectors = reuse_target_vectors and exported_with == (target["model"], target["dimension"])
+        logger.info(f"Also writing imported memories to migration target '{target['namespace']}'")
+
+    # Step 1: Restore the profile
+    profile = dict(header["profile"], user_id=user_id)
+    if overwrite_profile or not os.path.exists(get_user_profile_path(user_id)):
+        save_user_profile(user_id, profile)
+
+    # Step 2: Stream memories into the index in batches
+    count = 0
+    batch = []
+    for record in records:
+        metadata = dict(record["metadata"], user_id=user_id)
+        memory_id = record["id"]
+        if user_id != source_user_id:
+            memory_id = memory_id_prefix(user_id) + memory_id.rsplit("#", 1)[-1]
+        batch.append({"id": memory_id, "values": record.get("values"), "metadata": metadata})
+        if len(batch) == UPSERT_BATCH_SIZE:
+            count += _flush_import(batch, namespace, reuse_vectors, target, reuse_target_vectors)
+            batch = []
+    if batch:
+        count += _flush_import(batch, namespace, reuse_vectors, target, reuse_target_vectors)
+
+    logger.info(f"Imported {count} memories for user {user_id} from {path}")
+    return count
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export or import a user's memories and profile")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Write a user's data to .jsonl or .parquet")
+    export_parser.add_argument("user_id")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--no-values", action="store_true", help="Omit embedding vectors")
+
+    import_parser = commands.add_parser("import", help="Restore a user's data from an export")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--user-id", help="Import under a different user id")
+    import_parser.add_argument("--reembed", action="store_true", help="Re-embed instead of reusing vectors")
+    import_parser.add_argument("--keep-profile", action="store_true", help="Keep an existing local profile")
+    args = parser.parse_args()
+    configure_logging(json_format=False)
+
+    if args.command == "export":
+        export = export_user_parquet if args.path.endswith(".parquet") else export_user_jsonl
+        count = export(args.user_id, args.path, include_values=not args.no_values)
+        print(f"Exported {count} memories to {args.path}")
+    else:
+        count = import_user(args.path, user_id=args.user_id, reuse_vectors=not args.reembed,
+                            overwrite_profile=not args.keep_profile)
+        print(f"Imported {count} memories from {args.path}")
@@ -0,0 +1,94 @@
+import pytest
+from sub.lexicon import Lexicon, LexiconSet, build_lexicon, merge_level_profiles, read_word_list
+
+WORDS = [
+    # lemma, level, rank, pos, irregular forms
+    ("chat", "A1", 10, "noun", []),
+    ("chien", "A1", 12, "noun", []),
+    ("manger", "A1", 5, "verb", []),
+    ("maison", "A2", 20, "noun", []),
+    ("aller", "A1", 2, "verb", ["vais", "va", "iront"]),
+    ("voiture", "B1", 40, "noun", []),
+    ("philosophie", "C1", 900, "noun", []),
+    ("beau", "B1", 50, "adj", ["belle"]),
+    ("beau", "A1", 30, "adj", []),
+]
+
+@pytest.fixture
+def lexicon(tmp_path):
+    path = str(tmp_path / "french.lex")
+    build_lexicon(WORDS, path)
+    lexicon = Lexicon(path, "French")
+    yield lexicon
+    lexicon.close()
+
+#######################################
+# Building
+#######################################
+def test_read_word_list_skips_headers_comments_and_bad_lines(tmp_path):
+    path = tmp_path / "french.tsv"
+    path.write_text(
+        "lemma\tlevel\trank\tpos\tforms\n"
+        "# comment\n"
+        "\n"
+        "aller\tA1\t2\tverb\tvais,va\n"
+        "chat\tA1\tnot-a-rank\tnoun\n"
+        "chien\tA1\n"
+        "maison\tA2\t20\n",
+        encoding="utf-8",
+    )
+    assert list(read_word_list(str(path))) == [
+        ("aller", "A1", 2, "verb", ["vais", "va"]),
+        ("maison", "A2", 20, "", []),
+    ]
+
+def test_build_returns_the_lemma_count(tmp_path):
+    assert build_lexicon(WORDS, str(tmp_path / "french.lex")) == 8
+
+def test_opening_a_file_that_is_not_a_lexicon_fails(tmp_path):
+    path = tmp_path / "bad.lex"
+    path.write_bytes(b"not a lexicon at all")
+    with pytest.raises(ValueError):
+        Lexicon(str(path), "French")
+
+#######################################
+# Lookup
+#######################################
+def test_lookup_finds_lemmas_forms_and_inflections(lexicon):
+    assert lexicon.lookup("Chat").lemma == "chat"
+    assert lexicon.lookup("iront").lemma == "aller"
+    assert lexicon.lookup("mangeons").lemma == "manger"
+    assert lexicon.lookup("maisons").lemma == "maison"
+    assert lexicon.lookup("ordinateur") is None
+
+def test_lowest_level_sense_wins(lexicon):
+    entry = lexicon.lookup("belle")
+    assert (entry.lemma, entry.level, entry.rank, entry.pos) == ("beau", "A1", 30, "adj")
+
+def test_words_at_level_are_in_frequency_order(lexicon):
+    assert [entry.lemma for entry in lexicon.words_at_level("A1")] == ["aller", "manger", "chat", "chien", "beau"]
+    assert [entry.lemma for entry in lexicon.words_at_level("A1", pos="noun", exclude=["Chat"])] == ["chien"]
+
+def test_missing_language_has_no_lexicon(tmp_path, lexicon):
+    lexicons = LexiconSet(str(tmp_path))
+    assert lexicons.get("German") is None
+    assert lexicons.get("French").lookup("chat").lemma == "chat"
+
+#######################################
+# Level Profiles
+#######################################
+def test_level_profile_estimates_level_and_lists_harder_words(lexicon):
+    profile = lexicon.level_profile("Le chat et le chien va en voiture", target_level="A2")
+
+    assert (profile["words"], profile["known"]) == (8, 4)
+    assert profile["levels"]["A1"] == 3
+    assert profile["estimated_level"] == "B1"
+    assert profile["above_target"] == ["voiture"]
+
+def test_merged_profiles_match_profiling_the_joined_text(lexicon):
+    messages = ["le chat et le chien", "philosophie maison", "voiture philosophie chat"]
+    running = lexicon.level_profile("", target_level="A2")
+    for message in messages:
+        running = merge_level_profiles(running, lexicon.level_profile(message, target_level="A2"))
+
+    assert running == lexicon.level_profile("\n".join(messages), target_level="A2")
@@ -0,0 +1,77 @@
+import sys
+import json
+import logging
+import pytest
+from sub import logging_setup
+from sub.logging_setup import CategoryFilter, JsonFormatter, _AppQueueHandler
+
+def make_record(category, level=logging.INFO, msg="message", args=None, exc_info=None):
+    return logging.LogRecord(f"language_app.{category}", level, __file__, 1, msg, args, exc_info)
+
+#######################################
+# Category Filter
+#######################################
+def test_filter_tags_records_with_their_category():
+    record = make_record("memory")
+    assert CategoryFilter().filter(record)
+    assert record.category == "memory"
+
+def test_sampling_only_drops_records_below_warning(monkeypatch):
+    monkeypatch.setattr(logging_setup.random, "random", lambda: 0.5)
+    category_filter = CategoryFilter(sample_rates={"memory": 0.1}, rate_limits={"memory": 0})
+
+    assert not category_filter.filter(make_record("memory", logging.DEBUG))
+    assert not category_filter.filter(make_record("memory", logging.INFO))
+    assert category_filter.filter(make_record("memory", logging.WARNING))
+    # Other categories keep everything
+    assert category_filter.filter(make_record("agent", logging.INFO))
+
+def test_rate_limit_suppresses_and_reports_the_count(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(logging_setup.time, "monotonic", lambda: clock[0])
+    category_filter = CategoryFilter(rate_limits={"memory": 2})
+
+    assert [category_filter.filter(make_record("memory")) for _ in range(5)] == [True, True, False, False, False]
+    clock[0] += 0.5
+    record = make_record("memory")
+    assert category_filter.filter(record)
+    assert record.suppressed == 3
+    assert category_filter.filter(make_record("agent"))
+
+#######################################
+# Queue Handler
+#######################################
+def test_queued_records_keep_their_arguments_and_exception():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        exc_info = sys.exc_info()
+    args = {"count": 1}
+    record = make_record("memory", logging.ERROR, "Saved %(count)d", (args,), exc_info=exc_info)
+
+    prepared = _AppQueueHandler(None).prepare(record)
+    args["count"] = 2
+
+    assert prepared is not record
+    assert (prepared.msg, prepared.args) == ("Saved 1", None)
+    assert prepared.exc_info is exc_info
+    entry = json.loads(JsonFormatter().format(prepared))
+    assert entry["message"] == "Saved 1"
+    assert "ValueError: boom" in entry["exception"]
+
+def test_dropped_records_are_never_formatted(monkeypatch):
+    monkeypatch.setattr(logging_setup.random, "random", lambda: 0.99)
+    formatted = []
+
+    class Payload:
+        def __str__(self):
+            formatted.append(True)
+            return "payload"
+
+    category_filter = CategoryFilter(sample_rates={"memory": 0.5})
+    handler = _AppQueueHandler(None)
+    handler.addFilter(category_filter)
+    handler.enqueue = lambda record: pytest.fail("a sampled-out record was queued")
+    handler.handle(make_record("memory", logging.DEBUG, "%s", (Payload(),)))
+
+    assert formatted == []
@@ -0,0 +1,66 @@
+import numpy as np
+from sub.memory_selection import estimate_tokens, memory_text, select_memories
+
+def memory(text, score, values=None, day=1, memory_id=None):
+    candidate = {"payload": f"[2024-01-{day:02d} 10:00:00 UTC] {text}", "score": score, "values": values}
+    if memory_id:
+        candidate["id"] = memory_id
+    return candidate
+
+def texts(selected):
+    return [memory_text(payload) for payload in selected]
+
+def test_estimate_tokens_uses_four_characters_per_token():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+def test_memory_text_strips_the_timestamp():
+    assert memory_text("[2024-01-01 10:00:00 UTC] Likes cooking") == "Likes cooking"
+
+def test_empty_candidates_or_budget_select_nothing():
+    assert select_memories([], 100) == []
+    assert select_memories([memory("Likes cooking", 0.9)], 0) == []
+
+def test_selection_respects_the_token_budget():
+    candidates = [memory("a" * 400, 0.9), memory("short one", 0.8), memory("short two", 0.7)]
+    # The long memory doesn't fit, so the next best ones are used instead
+    assert texts(select_memories(candidates, 50, diversity=0)) == ["short one", "short two"]
+
+def test_selected_memories_are_in_chronological_order():
+    candidates = [memory("newest", 0.9, day=3), memory("oldest", 0.5, day=1), memory("middle", 0.7, day=2)]
+    assert texts(select_memories(candidates, 100)) == ["oldest", "middle", "newest"]
+
+def test_duplicates_collapse_to_one_copy():
+    candidates = [
+        memory("Likes cooking", 0.6, day=1, memory_id="a"),
+        memory("likes cooking ", 0.9, day=2, memory_id="b"),
+        memory("Likes cooking", 0.5, day=1, memory_id="a"),
+    ]
+    selected = select_memories(candidates, 100)
+    assert len(selected) == 1
+    assert selected[0].startswith("[2024-01-02")
+
+def test_diversity_prefers_a_different_memory_over_a_near_duplicate():
+    cooking = np.array([1.0, 0.0, 0.0])
+    near_cooking = np.array([0.9, 0.1, 0.0])
+    travel = np.array([0.0, 1.0, 0.0])
+    candidates = [
+        memory("Likes cooking", 0.9, cooking, day=1),
+        memory("Enjoys cooking pasta", 0.85, near_cooking, day=2),
+        memory("Travelled to Lyon", 0.6, travel, day=3),
+    ]
+
+    assert texts(select_memories(candidates, 100, diversity=0, max_similarity=1.0, max_items=2)) == [
+        "Likes cooking", "Enjoys cooking pasta"]
+    assert texts(select_memories(candidates, 100, diversity=0.5, max_items=2)) == [
+        "Likes cooking", "Travelled to Lyon"]
+
+def test_near_duplicates_are_not_packed_into_leftover_budget():
+    vector = np.array([1.0, 0.0])
+    candidates = [memory("Likes cooking", 0.9, vector), memory("Loves to cook", 0.88, vector * 2)]
+    assert texts(select_memories(candidates, 1000)) == ["Likes cooking"]
+
+def test_memories_without_vectors_are_ranked_by_relevance():
+    candidates = [memory("first", 0.9), memory("second", 0.8), memory("third", 0.7)]
+    assert texts(select_memories(candidates, 100, max_items=2)) == ["first", "second"]
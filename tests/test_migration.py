@@ -0,0 +1,107 @@
+import types
+import pytest
+from sub import migration
+from sub.migration import RateLimiter, load_checkpoint, migrate_embeddings, save_checkpoint
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(migration, "RETRY_BASE_DELAY", 0.0)
+
+class ResponseError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+class FakeIndex:
+    """Just enough of a Pinecone index for the migration job, optionally failing some upserts."""
+
+    def __init__(self, payloads=(), upsert_failures=()):
+        self.vectors = {f"u#{i}": {"payload": payload} for i, payload in enumerate(payloads)}
+        self.upserted = {}
+        self.upsert_failures = list(upsert_failures)
+
+    def describe_index_stats(self):
+        return types.SimpleNamespace(namespaces={"old": types.SimpleNamespace(vector_count=len(self.vectors))})
+
+    def list_paginated(self, namespace, limit, pagination_token):
+        ids = sorted(self.vectors)
+        start = int(pagination_token or 0)
+        next_token = str(start + limit) if start + limit < len(ids) else None
+        return types.SimpleNamespace(
+            vectors=[types.SimpleNamespace(id=i) for i in ids[start:start + limit]],
+            pagination=types.SimpleNamespace(next=next_token),
+        )
+
+    def fetch(self, ids, namespace):
+        return types.SimpleNamespace(vectors={
+            i: types.SimpleNamespace(id=i, metadata=self.vectors[i]) for i in ids
+        })
+
+    def upsert(self, vectors, namespace):
+        if self.upsert_failures:
+            raise self.upsert_failures.pop(0)
+        for vector in vectors:
+            self.upserted[vector["id"]] = vector
+
+def embed(texts, model, dimension):
+    return [[float(len(text))] * dimension for text in texts]
+
+def run(source, target, checkpoint_path, embed_batch=embed, dimension=2):
+    return migrate_embeddings(
+        source, "old", target, "new", embed_batch, model="new-model", dimension=dimension,
+        checkpoint_path=checkpoint_path, batch_size=2, concurrency=2, requests_per_minute=60000,
+    )
+
+def test_migration_re_embeds_every_memory(tmp_path):
+    source, target = FakeIndex([f"memory {i}" for i in range(7)]), FakeIndex()
+    checkpoint = run(source, target, str(tmp_path / "checkpoint.json"))
+
+    assert checkpoint["done"] and checkpoint["migrated"] == 7
+    assert set(target.upserted) == set(source.vectors)
+    assert target.upserted["u#3"]["metadata"] == {"payload": "memory 3"}
+    assert target.upserted["u#3"]["values"] == [8.0, 8.0]
+
+def test_transient_embedding_and_upsert_failures_are_retried(tmp_path):
+    failures = [ResponseError(429), TimeoutError()]
+
+    def flaky_embed(texts, model, dimension):
+        if failures:
+            raise failures.pop(0)
+        return embed(texts, model, dimension)
+
+    source = FakeIndex(["a", "b", "c"])
+    target = FakeIndex(upsert_failures=[ResponseError(503), ConnectionError()])
+    checkpoint = run(source, target, str(tmp_path / "checkpoint.json"), embed_batch=flaky_embed)
+
+    assert checkpoint["done"]
+    assert set(target.upserted) == set(source.vectors)
+
+def test_permanent_failures_stop_the_run_without_checkpointing(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    target = FakeIndex(upsert_failures=[ResponseError(400)])
+    with pytest.raises(ResponseError):
+        run(FakeIndex(["a", "b"]), target, path)
+    assert load_checkpoint(path) is None
+
+def test_checkpoint_for_another_dimension_is_rejected(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    save_checkpoint(path, {
+        "source_namespace": "old", "target_namespace": "new", "model": "new-model", "dimension": 512,
+        "pagination_token": "100", "migrated": 100, "done": False,
+    })
+    with pytest.raises(ValueError):
+        run(FakeIndex(["a"]), FakeIndex(), path, dimension=256)
+
+def test_rate_limiter_allows_a_burst_then_spaces_requests(monkeypatch):
+    clock = types.SimpleNamespace(now=0.0)
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(migration, "time", types.SimpleNamespace(monotonic=lambda: clock.now, sleep=sleep))
+    limiter = RateLimiter(requests_per_minute=60, burst=2)
+    for _ in range(4):
+        limiter.acquire()
+    assert sleeps == [pytest.approx(1.0), pytest.approx(1.0)]
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from sub.quantization import QuantizedVectorStore, hamming_distances, quantize_binary, quantize_int8, normalize
+
+DIMENSION = 32
+
+@pytest.fixture
+def vectors():
+    return normalize(np.random.default_rng(0).standard_normal((50, DIMENSION)))
+
+def stores(tmp_path):
+    """Every quantization mode, with full vectors in memory and spilled to disk."""
+    yield QuantizedVectorStore(DIMENSION, mode="float32")
+    for mode in ("int8", "binary"):
+        yield QuantizedVectorStore(DIMENSION, mode=mode)
+        yield QuantizedVectorStore(DIMENSION, mode=mode, full_vectors_path=str(tmp_path / f"{mode}.f32"))
+
+#######################################
+# Quantization Functions
+#######################################
+def test_int8_codes_round_trip_closely(vectors):
+    codes, scales = quantize_int8(vectors)
+    assert codes.dtype == np.int8
+    assert np.abs(codes / scales[:, None] - vectors).max() < 0.01
+
+def test_hamming_distance_counts_differing_signs():
+    codes = quantize_binary(np.array([[1.0] * 8, [-1.0] * 8, [1.0] * 4 + [-1.0] * 4]))
+    assert hamming_distances(codes, codes[0]).tolist() == [0, 8, 4]
+
+#######################################
+# Search
+#######################################
+def test_search_finds_each_stored_vector_first(tmp_path, vectors):
+    for store in stores(tmp_path):
+        store.add([f"v{i}" for i in range(len(vectors))], vectors, [{"i": i} for i in range(len(vectors))])
+        for i in (0, 17, 49):
+            vector_id, score, metadata = store.search(vectors[i], top_k=3)[0]
+            assert (vector_id, metadata) == (f"v{i}", {"i": i}), store.mode
+            assert score == pytest.approx(1.0, abs=1e-5)
+
+def test_search_on_an_empty_store_returns_nothing():
+    assert QuantizedVectorStore(DIMENSION).search(np.ones(DIMENSION)) == []
+
+def test_add_rejects_the_wrong_dimension():
+    with pytest.raises(ValueError):
+        QuantizedVectorStore(DIMENSION).add(["a"], [np.ones(DIMENSION + 1)])
+
+#######################################
+# Replacing Ids
+#######################################
+def test_repeated_id_in_one_batch_keeps_the_last_vector(tmp_path, vectors):
+    for store in stores(tmp_path):
+        assert store.add(["a", "a", "b"], vectors[:3], [{"n": 0}, {"n": 1}, {"n": 2}]) == 2
+        assert len(store) == 2
+        assert store.search(vectors[2], top_k=1)[0][0] == "b", store.mode
+        assert store.search(vectors[1], top_k=1)[0][0] == "a", store.mode
+        assert store.get("a")[1] == {"n": 1}
+
+def test_adding_a_stored_id_replaces_its_vector(tmp_path, vectors):
+    for store in stores(tmp_path):
+        store.add(["a", "b"], vectors[:2], [{"n": 0}, {"n": 1}])
+        store.search(vectors[0], top_k=1)  # Fold the first batch into the codes
+        store.add(["a"], vectors[2:3], [{"n": 2}])
+
+        assert len(store) == 2
+        vector_id, score, metadata = store.search(vectors[2], top_k=1)[0]
+        assert (vector_id, metadata) == ("a", {"n": 2}), store.mode
+        assert score == pytest.approx(1.0, abs=1e-5)
+        assert all(result[0] != "a" or result[1] < 0.99 for result in store.search(vectors[0], top_k=2))
@@ -0,0 +1,241 @@
+import types
+import sqlite3
+import pytest
+from sub import resilience
+from sub.resilience import CircuitBreaker, CircuitOpenError, MemoryOutbox, is_transient_error
+
+class Clock:
+    """Stands in for the time module so tests control both clocks."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience, "time", clock)
+    # Take the longest backoff so retry times are exact
+    monkeypatch.setattr(resilience, "random", types.SimpleNamespace(uniform=lambda low, high: high))
+    return clock
+
+class ResponseError(Exception):
+    """An error response carrying an HTTP status, like OpenAI's APIStatusError."""
+
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+def fail():
+    raise ConnectionError("dependency down")
+
+def reject():
+    raise ResponseError(400)
+
+#######################################
+# Transient Errors
+#######################################
+def test_timeouts_connection_errors_rate_limits_and_5xx_are_transient():
+    for error in (TimeoutError(), ConnectionError(), CircuitOpenError(), ResponseError(429), ResponseError(503)):
+        assert is_transient_error(error), error
+
+def test_other_errors_are_permanent():
+    for error in (ResponseError(400), ResponseError(404), ValueError("bad input"), KeyError("payload")):
+        assert not is_transient_error(error), error
+
+def test_client_library_errors_are_classified_by_status():
+    openai = pytest.importorskip("openai")
+    httpx = pytest.importorskip("httpx")
+    request = httpx.Request("POST", "https://api.openai.com/v1/embeddings")
+
+    def status_error(cls, status):
+        return cls("error", response=httpx.Response(status, request=request), body=None)
+
+    assert is_transient_error(openai.APITimeoutError(request))
+    assert is_transient_error(status_error(openai.RateLimitError, 429))
+    assert is_transient_error(status_error(openai.InternalServerError, 500))
+    assert not is_transient_error(status_error(openai.BadRequestError, 400))
+
+#######################################
+# Circuit Breaker
+#######################################
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30.0)
+    calls = []
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+    assert breaker.state == "closed"
+    # A success in between resets the count
+    breaker.call(lambda: None)
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        breaker.call(calls.append, "called")
+    assert calls == []
+
+def test_breaker_lets_one_trial_through_after_the_reset_timeout(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30.0)
+    with pytest.raises(ConnectionError):
+        breaker.call(fail)
+
+    clock.now += 29.0
+    assert breaker.state == "open"
+    clock.now += 1.0
+    assert breaker.state == "half_open"
+
+    def trial():
+        # Other calls keep failing fast while the trial is in flight
+        with pytest.raises(CircuitOpenError):
+            breaker.call(lambda: None)
+        return "ok"
+
+    assert breaker.call(trial) == "ok"
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+def test_failed_trial_reopens_the_breaker(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30.0)
+    with pytest.raises(ConnectionError):
+        breaker.call(fail)
+
+    clock.now += 30.0
+    with pytest.raises(ConnectionError):
+        breaker.call(fail)
+    assert breaker.state == "open"
+
+    # The open period restarts from the failed trial
+    clock.now += 29.0
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: None)
+    clock.now += 1.0
+    assert breaker.call(lambda: "ok") == "ok"
+
+def test_permanent_errors_do_not_open_the_breaker(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=30.0)
+    for _ in range(5):
+        with pytest.raises(ResponseError):
+            breaker.call(reject)
+    assert breaker.state == "closed"
+
+    # An error response also shows a half-open dependency is answering again
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+    clock.now += 30.0
+    with pytest.raises(ResponseError):
+        breaker.call(reject)
+    assert breaker.state == "closed"
+
+#######################################
+# Memory Outbox
+#######################################
+@pytest.fixture
+def outbox(tmp_path, clock):
+    return MemoryOutbox(str(tmp_path / "outbox.db"), base_delay=5.0, max_delay=60.0)
+
+def next_attempt(outbox, memory_id):
+    with outbox._connect() as conn:
+        return conn.execute("SELECT attempts, next_attempt FROM outbox WHERE memory_id = ?", (memory_id,)).fetchone()
+
+def test_outbox_waits_for_the_first_backoff(outbox, clock):
+    written = []
+    outbox.enqueue("m1", "u1", "payload", "ts", error="timeout")
+
+    assert outbox.replay_due(lambda *args: written.append(args)) == 0
+    clock.now += 5.0
+    assert outbox.replay_due(lambda *args: written.append(args)) == 1
+    assert written == [("m1", "u1", "payload", "ts")]
+    assert outbox.pending() == 0
+
+def test_outbox_backoff_doubles_up_to_the_maximum(outbox, clock):
+    def failing_writer(*args):
+        raise ConnectionError("still down")
+
+    outbox.enqueue("m1", "u1", "payload", "ts")
+    clock.now += 5.0
+    delays = []
+    for attempt in range(1, 6):
+        assert outbox.replay_due(failing_writer) == 0
+        attempts, due = next_attempt(outbox, "m1")
+        assert attempts == attempt
+        delays.append(due - clock.now)
+        clock.now = due
+
+    assert delays == [10.0, 20.0, 40.0, 60.0, 60.0]
+    assert outbox.pending() == 1
+
+def test_outbox_stops_the_pass_when_the_circuit_is_open(outbox, clock):
+    calls = []
+
+    def open_circuit(memory_id, *args):
+        calls.append(memory_id)
+        raise CircuitOpenError("index circuit is open")
+
+    outbox.enqueue("m1", "u1", "first", "ts")
+    outbox.enqueue("m2", "u1", "second", "ts")
+    clock.now += 5.0
+
+    assert outbox.replay_due(open_circuit) == 0
+    assert len(calls) == 1
+    assert outbox.pending() == 2
+
+def test_outbox_replays_a_write_under_the_same_id(outbox, clock):
+    outbox.enqueue("m1", "u1", "old", "ts")
+    outbox.enqueue("m1", "u1", "new", "ts")
+    assert outbox.pending() == 1
+
+    written = []
+    clock.now += 5.0
+    outbox.replay_due(lambda memory_id, user_id, payload, timestamp: written.append(payload))
+    assert written == ["new"]
+
+def test_outbox_dead_letters_permanent_failures(outbox, clock):
+    outbox.enqueue("m1", "u1", "too long", "ts")
+    outbox.enqueue("m2", "u1", "fine", "ts")
+    clock.now += 5.0
+
+    def writer(memory_id, *args):
+        if memory_id == "m1":
+            reject()
+
+    assert outbox.replay_due(writer) == 1
+    assert outbox.pending() == 0
+    assert outbox.dead_letters() == [
+        {"memory_id": "m1", "user_id": "u1", "payload": "too long", "attempts": 1, "error": "HTTP 400"}]
+
+    # Dead letters are never replayed again
+    clock.now += 10000.0
+    assert outbox.replay_due(lambda *args: pytest.fail("replayed a dead letter")) == 0
+
+def test_outbox_dead_letters_after_max_attempts(tmp_path, clock):
+    outbox = MemoryOutbox(str(tmp_path / "outbox.db"), base_delay=5.0, max_delay=60.0, max_attempts=3)
+    outbox.enqueue("m1", "u1", "payload", "ts")
+    for _ in range(3):
+        clock.now += 1000.0
+        outbox.replay_due(lambda *args: fail())
+
+    assert outbox.pending() == 0
+    assert [entry["attempts"] for entry in outbox.dead_letters()] == [3]
+
+def test_outbox_adds_the_dead_letter_column_to_old_journals(tmp_path, clock):
+    path = str(tmp_path / "outbox.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE outbox (memory_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, payload TEXT NOT NULL, "
+            "timestamp TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, next_attempt REAL NOT NULL, last_error TEXT)"
+        )
+        conn.execute("INSERT INTO outbox VALUES ('m1', 'u1', 'payload', 'ts', 2, 0, 'timeout')")
+
+    outbox = MemoryOutbox(path)
+    assert outbox.pending() == 1
+    assert outbox.replay_due(lambda *args: None) == 1
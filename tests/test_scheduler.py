@@ -0,0 +1,133 @@
+import threading
+import time
+import pytest
+from sub.scheduler import Scheduler, SchedulerOverloaded, TokenBucket
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the scheduler"
+        time.sleep(0.001)
+
+def unthrottled(**kwargs):
+    """A scheduler whose token buckets never run dry, so only concurrency and fairness matter."""
+    return Scheduler(global_rate=1000.0, global_burst=1000, user_rate=1000.0, user_burst=1000, **kwargs)
+
+#######################################
+# Token Bucket
+#######################################
+def test_token_bucket_refills_at_rate_up_to_capacity():
+    bucket = TokenBucket(rate=2.0, capacity=4)
+    bucket.updated = 100.0
+    bucket.take(4)
+
+    assert not bucket.available(1, 100.0)
+    assert bucket.time_until(1, 100.0) == pytest.approx(0.5)
+    assert bucket.available(1, 100.5)
+    assert bucket.time_until(4, 100.5) == pytest.approx(1.5)
+
+    assert bucket.available(4, 1000.0)
+    assert bucket.tokens == 4
+
+def test_user_bucket_limits_each_user_separately():
+    scheduler = Scheduler(global_rate=1000.0, global_burst=1000, user_rate=0.001, user_burst=1)
+
+    assert scheduler.try_acquire(user_id="alice", priority="interactive")
+    scheduler.release()
+    assert not scheduler.try_acquire(user_id="alice", priority="interactive")
+    assert scheduler.try_acquire(user_id="bob", priority="interactive")
+    scheduler.release()
+
+#######################################
+# Weighted Fair Queuing
+#######################################
+def test_waiting_calls_are_admitted_in_weighted_fair_order():
+    scheduler = unthrottled(max_concurrency=1)
+    admitted = []
+    threads = []
+
+    def call(priority):
+        with scheduler.slot(user_id=priority, priority=priority):
+            admitted.append(priority)
+
+    with scheduler.slot(user_id="holder", priority="interactive"):
+        # Background calls queue first, but interactive ones carry four times the weight
+        for priority in ["background"] * 3 + ["interactive"] * 9:
+            thread = threading.Thread(target=call, args=(priority,))
+            thread.start()
+            threads.append(thread)
+            wait_for(lambda: len(scheduler.waiting) == len(threads))
+    for thread in threads:
+        thread.join(timeout=5)
+
+    # Finish tags advance by 1/4 per interactive call and 1 per background call
+    assert admitted == (["interactive"] * 3 + ["background"]
+                        + ["interactive"] * 4 + ["background"]
+                        + ["interactive"] * 2 + ["background"])
+    assert scheduler.metrics()["classes"]["background"]["admitted"] == 3
+
+def test_background_calls_are_not_starved():
+    scheduler = unthrottled(max_concurrency=1)
+    admitted = []
+    threads = []
+
+    def call(priority):
+        with scheduler.slot(user_id=priority, priority=priority):
+            admitted.append(priority)
+
+    with scheduler.slot(user_id="holder", priority="interactive"):
+        for priority in ["interactive"] * 10 + ["background"]:
+            thread = threading.Thread(target=call, args=(priority,))
+            thread.start()
+            threads.append(thread)
+            wait_for(lambda: len(scheduler.waiting) == len(threads))
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert admitted.index("background") < 5
+
+#######################################
+# Load Shedding
+#######################################
+def test_calls_are_shed_when_the_queue_is_full():
+    scheduler = unthrottled(max_concurrency=1, max_queue={"interactive": 1, "background": 1})
+    waiter = threading.Thread(target=lambda: scheduler.run(lambda: None))
+
+    with scheduler.slot(user_id="holder", priority="interactive"):
+        waiter.start()
+        wait_for(lambda: len(scheduler.waiting) == 1)
+        with pytest.raises(SchedulerOverloaded):
+            with scheduler.slot(user_id="late", priority="interactive"):
+                pass
+    waiter.join(timeout=5)
+
+    stats = scheduler.metrics()["classes"]["interactive"]
+    assert stats["shed"] == 1
+    assert stats["admitted"] == 2
+
+def test_calls_are_shed_after_waiting_too_long():
+    scheduler = unthrottled(max_concurrency=1, max_wait={"interactive": 0.05, "background": 0.05})
+
+    with scheduler.slot(user_id="holder", priority="interactive"):
+        start = time.monotonic()
+        with pytest.raises(SchedulerOverloaded):
+            with scheduler.slot(user_id="waiter", priority="background"):
+                pass
+        assert time.monotonic() - start < 1.0
+
+    metrics = scheduler.metrics()
+    assert metrics["classes"]["background"]["shed"] == 1
+    assert metrics["classes"]["background"]["queue_depth"] == 0
+    assert metrics["in_flight"] == 0
+
+def test_try_acquire_never_queues_or_jumps_the_queue():
+    scheduler = unthrottled(max_concurrency=2)
+
+    assert scheduler.try_acquire(user_id="a", priority="interactive")
+    assert scheduler.try_acquire(user_id="b", priority="interactive")
+    assert not scheduler.try_acquire(user_id="c", priority="interactive")
+    assert scheduler.metrics()["in_flight"] == 2
+
+    scheduler.release()
+    scheduler.release()
+    assert scheduler.metrics()["in_flight"] == 0
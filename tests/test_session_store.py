@@ -0,0 +1,90 @@
+import types
+import pytest
+from sub import session_store
+from sub.session_store import HashRing, LocalRedis, RedisSessionStore, SessionStore, SQLiteSessionStore, create_session_store
+
+@pytest.fixture(params=["sqlite", "local_redis"])
+def store(request, tmp_path):
+    return create_session_store(request.param, path=str(tmp_path / "sessions.db"))
+
+#######################################
+# Round Trips
+#######################################
+def test_missing_session_loads_as_none(store):
+    assert store.load("nobody") is None
+
+def test_messages_and_state_round_trip(store):
+    messages = [
+        {"role": "system", "content": ""},
+        {"role": "assistant", "content": "¡Hola! ¿Qué tal?"},
+        {"role": "user", "content": "สวัสดีครับ"},
+    ]
+    for message in messages:
+        store.append_message("u1", message)
+    store.update_message("u1", 0, {"role": "system", "content": "You are a tutor."})
+    store.save_state("u1", {"mode_selected": True, "lesson_score": None})
+    store.save_state("u1", {"mode_selected": True, "lesson_score": 8})
+
+    saved = store.load("u1")
+    assert saved["messages"] == [{"role": "system", "content": "You are a tutor."}] + messages[1:]
+    assert saved["state"] == {"mode_selected": True, "lesson_score": 8}
+
+def test_state_without_messages_round_trips(store):
+    store.save_state("u1", {"conversation_started": False})
+    assert store.load("u1") == {"messages": [], "state": {"conversation_started": False}}
+
+def test_replace_and_clear(store):
+    store.append_message("u1", {"role": "user", "content": "old"})
+    store.save_state("u1", {"lesson_ended": True})
+    store.append_message("u2", {"role": "user", "content": "other user"})
+
+    store.replace_messages("u1", [{"role": "assistant", "content": "new"}])
+    assert store.load("u1")["messages"] == [{"role": "assistant", "content": "new"}]
+
+    store.clear("u1")
+    assert store.load("u1") is None
+    assert store.load("u2")["messages"] == [{"role": "user", "content": "other user"}]
+
+def test_incomplete_backend_fails_when_created():
+    class AppendOnlyStore(SessionStore):
+        def append_message(self, user_id, message):
+            pass
+
+    with pytest.raises(TypeError):
+        AppendOnlyStore()
+
+def test_sqlite_sessions_survive_a_restart(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    SQLiteSessionStore(path).append_message("u1", {"role": "user", "content": "hi"})
+    assert SQLiteSessionStore(path).load("u1")["messages"] == [{"role": "user", "content": "hi"}]
+
+def test_local_redis_sessions_expire_after_inactivity(monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(session_store, "time", types.SimpleNamespace(time=lambda: clock.now))
+    store = RedisSessionStore(LocalRedis(), ttl=60)
+
+    store.append_message("u1", {"role": "user", "content": "hi"})
+    clock.now += 50
+    store.save_state("u1", {"mode_selected": True})
+    # Saving refreshed the expiry for the whole session
+    clock.now += 50
+    assert store.load("u1")["messages"] == [{"role": "user", "content": "hi"}]
+    clock.now += 60
+    assert store.load("u1") is None
+
+#######################################
+# Consistent Hash Routing
+#######################################
+def test_hash_ring_only_moves_users_of_a_removed_node():
+    ring = HashRing(["node-a", "node-b", "node-c"])
+    users = [f"user-{i}" for i in range(500)]
+    before = {user: ring.node_for(user) for user in users}
+    assert set(before.values()) == {"node-a", "node-b", "node-c"}
+
+    ring.remove("node-b")
+    after = {user: ring.node_for(user) for user in users}
+    assert all(after[user] == before[user] for user in users if before[user] != "node-b")
+    assert "node-b" not in after.values()
+
+def test_empty_hash_ring_has_no_node():
+    assert HashRing([]).node_for("u1") is None
@@ -0,0 +1,92 @@
+import pytest
+from sub.srs import DAY, Card, Deck, SRSEngine, sm2_review
+
+@pytest.fixture
+def engine(tmp_path):
+    return SRSEngine(str(tmp_path / "srs.db"))
+
+#######################################
+# SM-2
+#######################################
+def test_sm2_intervals_grow_with_successful_reviews():
+    card = Card("chat")
+    intervals = []
+    for review in range(4):
+        sm2_review(card, 4, now=review * DAY)
+        intervals.append(card.interval)
+
+    assert intervals[:2] == [1.0, 6.0]
+    assert intervals[2] == round(6.0 * 2.5, 1)
+    assert card.reps == 4
+    assert card.ease == pytest.approx(2.5)
+
+def test_sm2_failed_recall_restarts_the_card():
+    card = Card("chat", interval=15.0, reps=3)
+    sm2_review(card, 1, now=0.0)
+
+    assert (card.reps, card.lapses, card.interval) == (0, 1, 0.0)
+    assert card.due == 10 * 60
+    assert card.ease < 2.5
+
+#######################################
+# Due Order
+#######################################
+def test_deck_returns_due_cards_most_overdue_first():
+    deck = Deck([Card("c", due=30.0), Card("a", due=10.0), Card("later", due=500.0), Card("b", due=20.0)])
+
+    assert [card.word for card in deck.due(now=100.0, limit=10)] == ["a", "b", "c"]
+    assert [card.word for card in deck.due(now=100.0, limit=2)] == ["a", "b"]
+    # Peeking doesn't consume the queue
+    assert [card.word for card in deck.due(now=100.0, limit=10)] == ["a", "b", "c"]
+
+def test_rescheduled_card_leaves_the_due_queue_once(engine):
+    engine.add_words("u1", "french", ["chat", "chien", "maison"], now=0.0)
+    engine.add_words("u1", "french", [{"word": "chien", "translation": "dog"}], now=50.0)
+
+    engine.record_answer("u1", "french", "chat", "good", now=100.0)
+    due = engine.due_cards("u1", "french", now=200.0)
+    assert [card.word for card in due] == ["chien", "maison"]
+
+    # A lapse comes back after ten minutes, ahead of cards due later
+    engine.record_answer("u1", "french", "maison", "again", now=200.0)
+    engine.add_words("u1", "french", ["voiture"], now=1000.0)
+    due = engine.due_cards("u1", "french", now=2000.0)
+    assert [card.word for card in due] == ["chien", "maison", "voiture"]
+    assert engine.stats("u1", "french", now=2000.0) == {"total": 4, "due": 3}
+
+def test_decks_are_separate_per_user_and_language(engine):
+    engine.add_words("u1", "french", ["chat"], now=0.0)
+    engine.add_words("u1", "spanish", ["gato"], now=0.0)
+    engine.add_words("u2", "french", ["chien"], now=0.0)
+
+    assert engine.words("u1", "french") == {"chat"}
+    assert engine.words("u1", "spanish") == {"gato"}
+    assert engine.words("u2", "french") == {"chien"}
+    assert engine.record_answer("u2", "french", "chat", "good") is None
+
+#######################################
+# Persistence
+#######################################
+def test_answers_survive_a_restart(tmp_path):
+    path = str(tmp_path / "srs.db")
+    engine = SRSEngine(path)
+    engine.add_words("u1", "french", [{"word": "chat", "translation": "cat"}], now=0.0)
+    engine.record_answer("u1", "french", "chat", "good", now=0.0)
+
+    card = SRSEngine(path).due_cards("u1", "french", now=DAY)[0]
+    assert (card.word, card.translation, card.reps, card.due) == ("chat", "cat", 1, DAY)
+
+def test_cached_deck_reloads_after_another_process_writes(tmp_path):
+    path = str(tmp_path / "srs.db")
+    first, second = SRSEngine(path), SRSEngine(path)
+    first.add_words("u1", "french", ["chat", "chien"], now=0.0)
+    # Both processes now hold the deck in memory
+    assert len(second.due_cards("u1", "french", now=0.0)) == 2
+
+    second.record_answer("u1", "french", "chat", "good", now=0.0)
+    first.record_answer("u1", "french", "chien", "good", now=0.0)
+
+    # The first process's stale copy of "chat" didn't overwrite the second's answer
+    reps = {card.word: card.reps for card in SRSEngine(path).due_cards("u1", "french", now=10 * DAY)}
+    assert reps == {"chat": 1, "chien": 1}
+    assert first.due_cards("u1", "french", now=0.0) == []